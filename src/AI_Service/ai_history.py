@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime
+
+# AI 對話紀錄存取：只讀取 system 提示與最近的對話視窗，避免整個集合載入
+DEFAULT_HISTORY_LIMIT = 20
+
+# 對話壓縮：非 system 訊息超過 COMPACT_THRESHOLD 則時，
+# 將較舊的對話摘要成一則記憶訊息，只保留最近 COMPACT_KEEP 則原始對話
+COMPACT_THRESHOLD = 60
+COMPACT_KEEP = 20
+MEMORY_PREFIX = "先前對話摘要："
+SUMMARY_INSTRUCTION = "請將以下對話整理成精簡的繁體中文摘要，保留使用者的偏好、重要事實與尚未完成的事項，不需要其他說明。"
+
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+def load_history(db, collection_name, limit=DEFAULT_HISTORY_LIMIT, max_chars=None):
+    """
+    取得對話視窗：第一則 system 提示 + 最近 limit 則對話。
+    依 _id（預設索引、隨寫入遞增）倒序取 limit 筆，只投影 role/content。
+    max_chars 為選用的字數預算，超過時由最舊的對話開始捨棄。
+    """
+    col = db[collection_name]
+    projection = {"_id": 0, "role": 1, "content": 1}
+
+    system = col.find_one({"role": "system", "kind": {"$ne": "memory"}}, projection, sort=[("_id", 1)])
+    memory = col.find_one({"kind": "memory"}, {"_id": 0, "role": 1, "content": 1, "kind": 1})
+    recent = list(
+        col.find({"role": {"$ne": "system"}}, projection)
+        .sort("_id", -1)
+        .limit(int(limit))
+    )
+    recent.reverse()
+
+    if max_chars:
+        budget = int(max_chars)
+        for doc in (system, memory):
+            if doc:
+                budget -= len(str(doc.get("content", "")))
+        total = sum(len(str(h.get("content", ""))) for h in recent)
+        while len(recent) > 1 and total > budget:
+            total -= len(str(recent.pop(0).get("content", "")))
+
+    # 視窗需以 user 訊息開頭，避免以 assistant 回覆開場
+    while recent and recent[0].get("role") != "user":
+        recent.pop(0)
+
+    return [doc for doc in (system, memory) if doc] + recent
+
+
+def _format_transcript(memory, turns):
+    """將記憶與對話整理成摘要用的文字稿"""
+    lines = []
+    if memory:
+        lines.append(memory.get("content", ""))
+    for h in turns:
+        speaker = "User:" if h.get("role") == "user" else "AI:"
+        lines.append(f"{speaker} {h.get('content', '')}")
+    return "\n".join(lines)
+
+
+def compact_history(db, collection_name, summarize, threshold=COMPACT_THRESHOLD, keep=COMPACT_KEEP):
+    """
+    對話超過 threshold 則時，將最舊的對話（保留最近 keep 則）交給 summarize
+    摘要成一則記憶訊息，原始對話移至 <collection_name>_archive。
+    summarize(transcript) 回傳摘要文字；回傳是否有進行壓縮。
+    """
+    col = db[collection_name]
+    count = col.count_documents({"role": {"$ne": "system"}})
+    if count <= threshold:
+        return False
+
+    old_turns = list(col.find({"role": {"$ne": "system"}}).sort("_id", 1).limit(count - keep))
+    memory = col.find_one({"kind": "memory"})
+    summary = summarize(_format_transcript(memory, old_turns))
+    if not summary:
+        return False
+
+    # 先封存再刪除，確保原始對話不會遺失
+    archived_at = datetime.now()
+    archive = [dict(h, archived_at=archived_at) for h in old_turns]
+    if memory:
+        archive.append(dict(memory, archived_at=archived_at))
+    db[f"{collection_name}_archive"].insert_many(archive)
+    col.delete_many({"_id": {"$in": [h["_id"] for h in old_turns]}})
+    if memory:
+        col.delete_one({"_id": memory["_id"]})
+    col.insert_one({"role": "system", "kind": "memory", "content": f"{MEMORY_PREFIX}{summary}"})
+    return True
+
+
+def compact_history_async(db, collection_name, summarize, threshold=COMPACT_THRESHOLD, keep=COMPACT_KEEP):
+    """在背景執行 compact_history，同一集合同時只會有一個壓縮工作"""
+    with _compacting_lock:
+        if collection_name in _compacting:
+            return None
+        _compacting.add(collection_name)
+
+    def run():
+        try:
+            compact_history(db, collection_name, summarize, threshold, keep)
+        except Exception as e:
+            print(f"對話壓縮失敗 ({collection_name}): {e}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(collection_name)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,7 @@
 from anthropic import Anthropic
 from ..utilities import read_config 
 from ..database import con_db, get_ai_model_config
+from .ai_history import load_history, compact_history_async, DEFAULT_HISTORY_LIMIT, SUMMARY_INSTRUCTION
 
 # 從配置文件中讀取 tokens
 config = read_config('config/config.txt')
@@ -11,9 +12,13 @@ role_collection = ai_db.ai_role_claude_his
 def _get_model():
     return get_ai_model_config(ai_db, "claude").get("model", "claude-haiku-4-5-20251001")
 
+def _get_history_window():
+    cfg = get_ai_model_config(ai_db, "claude")
+    return cfg.get("history_limit", DEFAULT_HISTORY_LIMIT), cfg.get("history_max_chars")
+
 def convert_to_claude_format(collection_name):
-    c_collection = ai_db[collection_name]
-    history = list(c_collection.find())
+    limit, max_chars = _get_history_window()
+    history = load_history(ai_db, collection_name, limit, max_chars)
     formatted_messages = [
         {
             "role": "user" if h.get("role") == "user" else "assistant",
@@ -23,6 +28,11 @@ def convert_to_claude_format(collection_name):
     ]
     return formatted_messages
 
+def _get_memory(collection_name):
+    """Claude 沒有 system 訊息，壓縮後的對話摘要改放在 system 參數"""
+    memory = ai_db[collection_name].find_one({"kind": "memory"}, {"content": 1})
+    return f"\n{memory['content']}" if memory else ""
+
 def generate_summary(user_input):
     user_message = {"role": "user", "content": user_input}
     collection.insert_one(user_message)
@@ -31,14 +41,27 @@ def generate_summary(user_input):
     response = claude.messages.create(
         model=_get_model(),
         max_tokens=1000,
-        system="用繁體中文回答",
+        system="用繁體中文回答" + _get_memory("ai_his"),
         messages=conversation_history
     )
     
     assistant_message = response.content[0].text
     collection.insert_one({"role": "assistant", "content": assistant_message})
+    # 對話過長時於背景摘要舊對話
+    compact_history_async(ai_db, "ai_his", _summarize_history)
     return assistant_message
 
+def _summarize_history(transcript):
+    response = claude.messages.create(
+        model=_get_model(),
+        max_tokens=1000,
+        system=SUMMARY_INSTRUCTION,
+        messages=[
+            {"role": "user", "content": transcript}
+        ]
+    )
+    return response.content[0].text.strip()
+
 def clear_conversation_history():
     collection.delete_many({})
     collection.insert_one({"role": "system", "content": "用繁體中文回答"})
@@ -9,6 +9,7 @@ from io import BytesIO
 from openai import OpenAI
 from ..utilities import read_config
 from ..database import con_db, get_ai_model_config
+from .ai_history import load_history, DEFAULT_HISTORY_LIMIT
 from opencc import OpenCC
 
 cc = OpenCC('s2t')  # 簡體轉繁體
@@ -19,6 +20,10 @@ config = read_config('config/config.txt')
 ai_db = con_db(config)
 def _get_model():
     return get_ai_model_config(ai_db, "dzmm").get("model", "nalang-xl-10")
+
+def _get_history_window():
+    cfg = get_ai_model_config(ai_db, "dzmm")
+    return cfg.get("history_limit", DEFAULT_HISTORY_LIMIT), cfg.get("history_max_chars")
 api_key = config['DZMM_API_KEY']
 api_url = config['DZMM_API_URL']
 
@@ -29,8 +34,9 @@ def generate_summary(user_input, collection_name="ai_dzmm_his"):
     user_message = {"role": "user", "content": user_input}
     collection_his.insert_one(user_message)    
 
-    # 取得歷史訊息（不含 _id）
-    history_messages = list(collection_his.find({}, {"_id": 0}))
+    # 取得最近的對話視窗（不含 _id）
+    limit, max_chars = _get_history_window()
+    history_messages = load_history(ai_db, collection_name, limit, max_chars)
 
     # 合併成完整對話歷程
     conversation_history = history_messages
@@ -12,6 +12,7 @@ from google import genai
 from google.genai import types
 from ..utilities import read_config
 from ..database import con_db, get_ai_model_config
+from .ai_history import load_history, compact_history_async, DEFAULT_HISTORY_LIMIT, SUMMARY_INSTRUCTION
 from ..AI_Service.openai import painting
 from ..AI_Service.ai_tool import read_url_content, get_technical_indicators
 from ..stock import get_stock_info, get_historical_data, get_current_date
@@ -28,6 +29,10 @@ def _get_model():
 
 def _get_image_model():
     return get_ai_model_config(ai_db, "gemini").get("image_model", "gemini-3.1-flash-image-preview")
+
+def _get_history_window():
+    cfg = get_ai_model_config(ai_db, "gemini")
+    return cfg.get("history_limit", DEFAULT_HISTORY_LIMIT), cfg.get("history_max_chars")
 collection = ai_db.ai_his
 
 
@@ -65,8 +70,8 @@ TOOLS = [
 
 def convert_to_gemini_format(collection_name):
     """轉換資料庫格式為 Gemini API 格式"""
-    c_collection = ai_db[collection_name]
-    history = list(c_collection.find())
+    limit, max_chars = _get_history_window()
+    history = load_history(ai_db, collection_name, limit, max_chars)
     
     contents = []
     for h in history:
@@ -169,11 +174,25 @@ def generate_summary(user_input):
             assistant_message = "無法生成回應"
             
         collection.insert_one({"role": "assistant", "content": assistant_message})
+        # 對話過長時於背景摘要舊對話
+        compact_history_async(ai_db, "ai_his", _summarize_history)
         return assistant_message
         
     except Exception as e:
         return f"生成失敗: {e}"
 
+def _summarize_history(transcript):
+    client = genai.Client(api_key=GEMINI_API_KEY)
+    response = client.models.generate_content(
+        model=_get_model(),
+        contents=transcript,
+        config=types.GenerateContentConfig(
+            system_instruction=SUMMARY_INSTRUCTION,
+            temperature=0.3
+        )
+    )
+    return response.text.strip() if response.text else ""
+
 def painting(text):
     """使用 Gemini 將中文描述轉換為英文圖片提示詞"""
     try:
@@ -2,6 +2,7 @@ import openai
 from openai import OpenAI
 from ..utilities import read_config
 from ..database import con_db, get_ai_model_config
+from .ai_history import load_history, compact_history_async, DEFAULT_HISTORY_LIMIT, SUMMARY_INSTRUCTION
 import os
 import base64
 from datetime import datetime
@@ -18,13 +19,17 @@ def _get_model():
 
 def _get_image_model():
     return get_ai_model_config(ai_db, "openai").get("image_model", "gpt-image-2")
+
+def _get_history_window():
+    cfg = get_ai_model_config(ai_db, "openai")
+    return cfg.get("history_limit", DEFAULT_HISTORY_LIMIT), cfg.get("history_max_chars")
 collection = ai_db.ai_his
 
 
 # 定義一個函數來轉換每條記錄為 OpenAI API 格式
 def convert_to_openai_format(collection_name):
-    c_collection = ai_db[collection_name]
-    history = list(c_collection.find())    
+    limit, max_chars = _get_history_window()
+    history = load_history(ai_db, collection_name, limit, max_chars)
     # 使用列表解析進行轉換
     formatted_messages = [
         {
@@ -46,9 +51,21 @@ def generate_summary(user_input):
     )
     assistant_message = response.choices[0].message.content
     collection.insert_one({"role": "assistant", "content": assistant_message})
+    # 對話過長時於背景摘要舊對話
+    compact_history_async(ai_db, "ai_his", _summarize_history)
 
     return assistant_message
 
+def _summarize_history(transcript):
+    response = OpenAI_clice.chat.completions.create(
+        model=_get_model(),
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTION},
+            {"role": "user", "content": transcript}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
 def clear_conversation_history():
     collection.delete_many({})
     collection.insert_one({"role": "system", "content": "用繁體中文"})    
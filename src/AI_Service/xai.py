@@ -8,6 +8,7 @@ from io import BytesIO
 from openai import OpenAI
 from ..utilities import read_config
 from ..database import con_db, get_ai_model_config
+from .ai_history import load_history, compact_history_async, DEFAULT_HISTORY_LIMIT, SUMMARY_INSTRUCTION
 
 # 從配置文件中讀取 tokens
 config = read_config('config/config.txt')
@@ -20,14 +21,18 @@ XAI_clice = OpenAI(
 def _get_model():
     return get_ai_model_config(ai_db, "xai").get("model", "grok-4.3-latest")
 
+def _get_history_window():
+    cfg = get_ai_model_config(ai_db, "xai")
+    return cfg.get("history_limit", DEFAULT_HISTORY_LIMIT), cfg.get("history_max_chars")
+
 
 collection = ai_db.ai_his
 role_collection = ai_db.ai_role_xai_his
 
 # 定義一個函數來轉換每條記錄為 
 def convert_to_openai_format(collection_name):
-    c_collection = ai_db[collection_name]
-    history = list(c_collection.find())    
+    limit, max_chars = _get_history_window()
+    history = load_history(ai_db, collection_name, limit, max_chars)
     # 使用列表解析進行轉換
     formatted_messages = [
         {
@@ -49,9 +54,21 @@ def generate_summary(user_input, collection_name="ai_his"):
     )
     assistant_message = response.choices[0].message.content
     collection_his.insert_one({"role": "assistant", "content": assistant_message})
+    # 對話過長時於背景摘要舊對話
+    compact_history_async(ai_db, collection_name, _summarize_history)
 
     return assistant_message
 
+def _summarize_history(transcript):
+    response = XAI_clice.chat.completions.create(
+        model=_get_model(),
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTION},
+            {"role": "user", "content": transcript}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
 def clear_conversation_history(collection_name="ai_his",system_message="請用繁體中文回答"):
     collection_history = ai_db[collection_name]
     collection_history.delete_many({})
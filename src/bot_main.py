@@ -15,10 +15,17 @@ from .model.shop_model import COMMANDS_HELP as SHOP_COMMANDS
 from .model.ai_model import COMMANDS_HELP as AI_COMMANDS
 from .model.crypto_model import COMMANDS_HELP as CRYPTO_COMMANDS
 
+from .model.handlers_model import INDEXES as HANDLER_INDEXES
+from .model.coin_model import INDEXES as COIN_INDEXES
+from .model.shop_model import INDEXES as SHOP_INDEXES
+
 from .utilities import read_config
-from .database import con_db, init_ai_model_configs
+from .database import con_db, init_ai_model_configs, watch_ai_model_configs
+from .database import INDEXES as DB_INDEXES, ensure_indexes, enable_query_profiling, find_unindexed_queries
 from .model.resource_monitor import ResourceCleaner, register_resource_commands
-from .AI_Service.ai_tool import  read_url_content
+from .AI_Service.ai_tool import  read_url_content, enable_url_cache_persistence
+from .AI_Service.ai_tool import INDEXES as URL_CACHE_INDEXES
+from .jobs import get_job_stats_text
 from datetime import datetime, timedelta
 import os
 import re
@@ -26,13 +33,22 @@ import re
 # 從配置文件中讀取 tokens
 config = read_config('config/config.txt')
 db = con_db(config)
+# 各模組宣告的索引，啟動時統一建立
+ALL_INDEXES = DB_INDEXES + COIN_INDEXES + SHOP_INDEXES + HANDLER_INDEXES + URL_CACHE_INDEXES
+ensure_indexes(db, ALL_INDEXES)
+if config.get('MONGO_PROFILE_SLOW_MS'):
+    enable_query_profiling(db, config['MONGO_PROFILE_SLOW_MS'])  # 記錄慢查詢供 !慢查詢 檢視
 init_ai_model_configs(db)  # 確保 AI 模型設定已初始化至 MongoDB
+watch_ai_model_configs(db)  # 監看模型設定異動，同步清除快取
+enable_url_cache_persistence(db)  # 網頁讀取結果快取保存至 MongoDB
 # 初始化 Slack App
 app = App(token=config['SLACK_BOT_TOKEN'], signing_secret=config['SLACK_SIGNING_SECRET'])
 
 ALL_COMMANDS = [
     ("!help 或 !指令", "顯示所有可用指令"),
     ("!cleanup 或 !清理資料庫", "檢查並清理空的資料庫Collection"),
+    ("!jobs", "查看背景工作佇列狀態"),
+    ("!慢查詢", "列出未使用索引（全表掃描）的慢查詢"),
 ]
 
 def get_all_commands_text():
@@ -44,6 +60,27 @@ def get_all_commands_text():
 def show_help(message, say):
     say(get_all_commands_text())
 
+@app.message(re.compile(r"^!jobs$"))
+def show_jobs(message, say):
+    """顯示背景工作佇列的深度與等待時間"""
+    say(get_job_stats_text())
+
+@app.message(re.compile(r"^!慢查詢$"))
+def show_unindexed_queries(message, say):
+    """列出 system.profile 中以 COLLSCAN 執行的慢查詢"""
+    try:
+        queries = find_unindexed_queries(db)
+    except Exception as e:
+        say(f"❌ 讀取慢查詢紀錄失敗: {e}")
+        return
+    if not queries:
+        say("✅ 沒有未使用索引的慢查詢紀錄（需設定 MONGO_PROFILE_SLOW_MS 開啟 profiler）。")
+        return
+    lines = ["🐢 *未使用索引的慢查詢*"]
+    for q in queries:
+        lines.append(f"• `{q['ns']}` {q['op']} {q['millis']}ms，掃描 {q['docs_examined']} 筆，條件：`{q['filter']}`")
+    say("\n".join(lines))
+
 @app.message(re.compile(r"^!cleanup$|^!清理資料庫$"))
 def handle_database_cleanup(message, say):
     """處理資料庫清理指令"""
@@ -62,6 +99,8 @@ def handle_database_cleanup(message, say):
             
             if result['deleted_collections']:
                 response += f"\n 已刪除: {', '.join(result['deleted_collections'])}"
+                # 刪除 collection 會一併刪除索引，立即依宣告重建
+                ensure_indexes(db, ALL_INDEXES)
         else:
             response = "❌ 資料庫清理失敗，請檢查連線狀態"
             
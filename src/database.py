@@ -1,26 +1,134 @@
-from pymongo import MongoClient
+import threading
+import time
+from pymongo import MongoClient, DESCENDING
+from pymongo.errors import OperationFailure
 
-#創建連線
-def con_db(config):        
+# 程序內共用的 MongoClient（依連線字串區分），避免每個模組各自建立連線池
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(config):
+    """
+    取得共用的 MongoClient，同一連線字串在整個程序中只建立一次。
+    連線池大小、逾時與 appname 可由設定檔調整：
+    MONGO_MAX_POOL_SIZE、MONGO_MIN_POOL_SIZE、MONGO_CONNECT_TIMEOUT_MS、
+    MONGO_SERVER_SELECTION_TIMEOUT_MS、MONGO_APP_NAME
+    """
     user=config['MONGO_USER']
     pas=config['MONGO_PASSWORD']
     host=config['MONGO_HOST']
     port=config['MONGO_PORT']
     con_str=f"mongodb://{user}:{pas}@{host}:{port}/?authMechanism=SCRAM-SHA-1&authSource=admin"
-    # MongoDB 連線
-    client = MongoClient(con_str)
+    with _clients_lock:
+        client = _clients.get(con_str)
+        if client is None:
+            # connect=False：第一次實際查詢時才建立連線
+            client = MongoClient(
+                con_str,
+                maxPoolSize=int(config.get('MONGO_MAX_POOL_SIZE', 20)),
+                minPoolSize=int(config.get('MONGO_MIN_POOL_SIZE', 0)),
+                connectTimeoutMS=int(config.get('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+                serverSelectionTimeoutMS=int(config.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+                appname=config.get('MONGO_APP_NAME', 'slack_bot_demo'),
+                connect=False
+            )
+            _clients[con_str] = client
+    return client
+
+#創建連線
+def con_db(config):        
+    # MongoDB 連線（共用連線池）
+    client = get_client(config)
     db = client.myDatabase
     return db
 
 # AI 模型預設設定
+# history_limit：每次送出的最近對話則數（不含 system 提示）
 _DEFAULT_AI_MODEL_CONFIGS = [
-    {"service": "claude",  "model": "claude-haiku-4-5-20251001"},
-    {"service": "openai",  "model": "gpt-5.4",            "image_model": "gpt-image-2"},
-    {"service": "xai",     "model": "grok-4.3-latest"},
-    {"service": "dzmm",    "model": "nalang-xl-10"},
-    {"service": "gemini",  "model": "gemini-2.5-flash",   "image_model": "gemini-3.1-flash-image-preview"},
+    {"service": "claude", "model": "claude-haiku-4-5-20251001",                                                  "history_limit": 20},
+    {"service": "openai", "model": "gpt-5.4",                   "image_model": "gpt-image-2",                    "history_limit": 20},
+    {"service": "xai",    "model": "grok-4.3-latest",                                                            "history_limit": 20},
+    {"service": "dzmm",   "model": "nalang-xl-10",                                                               "history_limit": 30},
+    {"service": "gemini", "model": "gemini-2.5-flash",          "image_model": "gemini-3.1-flash-image-preview", "history_limit": 20},
+]
+
+# 本模組需要的索引：(collection, keys, options)，由 bot_main 啟動時統一建立
+INDEXES = [
+    ("ai_model_config", [("service", 1)], {"unique": True}),
 ]
 
+def ensure_indexes(db, declarations):
+    """
+    依宣告建立缺少的索引（可重複執行）。
+    declarations: [(collection, [(欄位, 方向), ...], {選項}), ...]
+    已有相同欄位組合的索引則略過；建立失敗（例如既有資料違反 unique）只記錄不中斷啟動。
+    回傳新建立的索引數。
+    """
+    created = 0
+    existing = {}
+    for collection_name, keys, options in declarations:
+        if collection_name not in existing:
+            try:
+                info = db[collection_name].index_information()
+            except OperationFailure:
+                info = {}
+            existing[collection_name] = {tuple(tuple(k) for k in idx["key"]) for idx in info.values()}
+        key = tuple((field, direction) for field, direction in keys)
+        if key in existing[collection_name]:
+            continue
+        try:
+            db[collection_name].create_index(keys, **options)
+            existing[collection_name].add(key)
+            created += 1
+        except OperationFailure as e:
+            print(f"建立索引失敗 {collection_name} {keys}: {e}")
+    if created:
+        print(f"✅ 已建立 {created} 個索引")
+    return created
+
+def enable_query_profiling(db, slow_ms):
+    """開啟 MongoDB profiler，記錄超過 slow_ms 的查詢（託管服務不支援時略過）"""
+    try:
+        db.command("profile", 1, slowms=int(slow_ms))
+        return True
+    except OperationFailure as e:
+        print(f"無法開啟查詢 profiler: {e}")
+        return False
+
+def find_unindexed_queries(db, limit=10):
+    """
+    從 system.profile 找出以全表掃描（COLLSCAN）執行的慢查詢，依耗時排序。
+    需先以 enable_query_profiling 開啟 profiler。
+    """
+    cursor = db.system.profile.find(
+        {"planSummary": {"$regex": "COLLSCAN"}},
+        {"ns": 1, "op": 1, "millis": 1, "docsExamined": 1, "command.filter": 1, "ts": 1}
+    ).sort("millis", DESCENDING).limit(limit)
+    return [
+        {
+            "ns": doc.get("ns"),
+            "op": doc.get("op"),
+            "millis": doc.get("millis", 0),
+            "docs_examined": doc.get("docsExamined", 0),
+            "filter": (doc.get("command") or {}).get("filter"),
+            "ts": doc.get("ts"),
+        }
+        for doc in cursor
+    ]
+
+# ai_model_config 記憶體快取：{service: (設定, 載入時間)}
+AI_MODEL_CONFIG_TTL = 60
+_ai_model_config_cache = {}
+_ai_model_config_lock = threading.Lock()
+
+def invalidate_ai_model_config(service_name: str = None):
+    """清除模型設定快取；未指定 service 時清除全部。"""
+    with _ai_model_config_lock:
+        if service_name is None:
+            _ai_model_config_cache.clear()
+        else:
+            _ai_model_config_cache.pop(service_name, None)
+
 def init_ai_model_configs(db):
     """初始化 ai_model_config 集合；若文件已存在則以預設值覆蓋。"""
     col = db.ai_model_config
@@ -30,16 +138,28 @@ def init_ai_model_configs(db):
             {"$set": cfg},
             upsert=True
         )
+    invalidate_ai_model_config()
 
 def get_ai_model_config(db, service_name: str) -> dict:
-    """從 MongoDB ai_model_config 取得指定服務的模型設定，找不到時回傳預設值。"""
+    """
+    取得指定服務的模型設定，找不到時回傳預設值。
+    結果快取 AI_MODEL_CONFIG_TTL 秒，!setmodel 更新時會立即清除快取。
+    """
+    now = time.time()
+    with _ai_model_config_lock:
+        cached = _ai_model_config_cache.get(service_name)
+    if cached and now - cached[1] < AI_MODEL_CONFIG_TTL:
+        return cached[0]
+
     col = db.ai_model_config
     doc = col.find_one({"service": service_name}, {"_id": 0})
-    if doc:
-        return doc
-    # fallback：回傳硬編碼預設值
-    defaults = {c["service"]: c for c in _DEFAULT_AI_MODEL_CONFIGS}
-    return defaults.get(service_name, {})
+    if not doc:
+        # fallback：回傳硬編碼預設值
+        defaults = {c["service"]: c for c in _DEFAULT_AI_MODEL_CONFIGS}
+        doc = defaults.get(service_name, {})
+    with _ai_model_config_lock:
+        _ai_model_config_cache[service_name] = (doc, now)
+    return doc
 
 def update_ai_model_config(db, service_name: str, field: str, value: str) -> bool:
     """更新指定服務的模型設定欄位，回傳是否成功。"""
@@ -49,8 +169,26 @@ def update_ai_model_config(db, service_name: str, field: str, value: str) -> boo
         {"$set": {field: value}},
         upsert=False
     )
+    invalidate_ai_model_config(service_name)
     return result.matched_count > 0
 
+def watch_ai_model_configs(db):
+    """
+    以 change stream 監看 ai_model_config，其他程序修改設定時同步清除快取。
+    change stream 需要 replica set，不支援時僅依 TTL 過期。
+    """
+    def watch():
+        try:
+            with db.ai_model_config.watch() as stream:
+                for _ in stream:
+                    invalidate_ai_model_config()
+        except Exception as e:
+            print(f"ai_model_config change stream 未啟用，改以 TTL 更新快取: {e}")
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
+
 def list_ai_model_configs(db) -> list:
     """列出所有服務的模型設定。"""
     col = db.ai_model_config
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 背景工作佇列：耗時指令（LLM、生圖、瀏覽器）依類別放到各自的有界執行緒池，
+# 避免佔住 Bolt 的 listener 執行緒，讓 !查幣 這類快速指令不會被卡住
+# ──────────────────────────────────────────────────────────────────────────────
+class JobQueue:
+    """單一工作類別的有界背景佇列，並記錄排隊深度與等待時間"""
+
+    def __init__(self, name, workers, max_pending):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{name}")
+        # 執行中 + 排隊中的工作數上限
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        送出工作，回傳送出時前方排隊的工作數；
+        佇列已滿時回傳 None（工作不會執行）。
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            ahead = self.pending
+            self.pending += 1
+        enqueued_at = time.monotonic()
+        self._executor.submit(self._run, enqueued_at, fn, args, kwargs)
+        return ahead
+
+    def _run(self, enqueued_at, fn, args, kwargs):
+        wait = time.monotonic() - enqueued_at
+        with self._lock:
+            self.pending -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            fn(*args, **kwargs)
+            ok = True
+        except Exception as e:
+            print(f"背景工作失敗 ({self.name}): {e}")
+            ok = False
+        finally:
+            with self._lock:
+                self.running -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._slots.release()
+
+    def stats(self):
+        """目前的佇列指標"""
+        with self._lock:
+            started = self.completed + self.failed + self.running
+            return {
+                "name": self.name,
+                "workers": self.workers,
+                "pending": self.pending,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait": self.total_wait / started if started else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+# 工作類別：llm（文字對話）、image（生圖／改圖）、browser（Playwright 爬取）、
+# stock（股票歷史資料，TWSE 請求本身已全域限速，單一執行緒即可）
+JOB_QUEUES = {
+    "llm": JobQueue("llm", workers=4, max_pending=20),
+    "image": JobQueue("image", workers=2, max_pending=10),
+    "browser": JobQueue("browser", workers=2, max_pending=10),
+    "stock": JobQueue("stock", workers=1, max_pending=10),
+}
+
+
+def submit_job(kind, say, fn, *args, thread_ts=None, **kwargs):
+    """
+    將工作送到 kind 類別的佇列；佇列已滿時直接回覆使用者。
+    回傳是否成功排入。
+    """
+    ahead = JOB_QUEUES[kind].submit(fn, *args, **kwargs)
+    if ahead is None:
+        say("⚠️ 目前排隊的工作太多，請稍後再試。", thread_ts=thread_ts)
+        return False
+    if ahead > 0:
+        say(f"⏳ 已排入佇列，前面還有 {ahead} 個工作。", thread_ts=thread_ts)
+    return True
+
+
+def get_job_stats_text():
+    """格式化所有佇列的指標"""
+    lines = ["📊 *背景工作佇列*"]
+    for q in JOB_QUEUES.values():
+        st = q.stats()
+        lines.append(
+            f"• `{st['name']}` 執行中 {st['running']}/{st['workers']}，排隊 {st['pending']}，"
+            f"完成 {st['completed']}，失敗 {st['failed']}，拒絕 {st['rejected']}，"
+            f"平均等待 {st['avg_wait']:.1f}s，最長等待 {st['max_wait']:.1f}s"
+        )
+    return "\n".join(lines)
@@ -3,45 +3,125 @@ Access Log Analyzer Module
 處理和分析網站存取記錄檔的模組
 """
 
+import os
 import re
 import json
+import mmap
+import queue
+import threading
+from array import array
 from datetime import datetime
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Union
 import ipaddress
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from .database import con_db
 from .utilities import read_config
 
 
+# 機器人 User Agent 關鍵字（比對時不分大小寫）
+BOT_INDICATORS = [
+    'bot', 'crawler', 'spider', 'scraper', 'wget', 'curl',
+    'Googlebot', 'Bingbot', 'facebookexternalhit', 'Twitterbot',
+    'zgrab', 'CensysInspect', 'OAI-SearchBot'
+]
+_BOT_INDICATORS_LOWER = tuple(indicator.lower() for indicator in BOT_INDICATORS)
+
+# 可疑路徑關鍵字
+SUSPICIOUS_PATTERNS = [
+    'shell', 'admin', 'login', 'password', 'wp-admin', 
+    'phpmyadmin', 'config', '.git', '.env', 'backup',
+    'sql', 'dump', 'exploit', 'hack'
+]
+SUSPICIOUS_STATUS_CODES = (400, 401, 403, 404)
+ERROR_STATUS_CODES = (404, 400, 403, 500, 502, 503)
+
+# Apache/Nginx Combined Log Format（含額外欄位），模組載入時編譯一次
+LOG_LINE_PATTERN = re.compile(
+    r'^(\S+) \S+ \S+ \[([^\]]+)\] "([^"]*)" (\d+) (\d+|-) "([^"]*)" "([^"]*)" "([^"]*)"'
+)
+
+_MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
+# 時間戳解析結果快取：同一秒內的記錄共用同一個 datetime
+_timestamp_memo: Dict[str, datetime] = {}
+_TIMESTAMP_MEMO_SIZE = 4096
+
+
+def parse_log_timestamp(value: str) -> Optional[datetime]:
+    """
+    解析 '22/Jul/2025:01:54:28 +0000' 格式的時間戳（時區部分忽略）。
+    固定格式直接依位置切字串，其他格式才交給 strptime。
+    """
+    parts = value.split(None, 1)
+    if not parts:
+        return None
+    key = parts[0]
+    cached = _timestamp_memo.get(key)
+    if cached is not None:
+        return cached
+    try:
+        # 分隔符號與數字欄位都要符合，否則交給 strptime（int() 會接受 '+1'、'0_1' 等寫法）
+        if (len(key) == 20 and key[2] == '/' and key[6] == '/'
+                and key[11] == ':' and key[14] == ':' and key[17] == ':'
+                and key[0:2].isdigit() and key[7:11].isdigit() and key[12:14].isdigit()
+                and key[15:17].isdigit() and key[18:20].isdigit()):
+            result = datetime(
+                int(key[7:11]), _MONTHS[key[3:6]], int(key[0:2]),
+                int(key[12:14]), int(key[15:17]), int(key[18:20])
+            )
+        else:
+            result = datetime.strptime(key, "%d/%b/%Y:%H:%M:%S")
+    except (KeyError, ValueError):
+        try:
+            result = datetime.strptime(key, "%d/%b/%Y:%H:%M:%S")
+        except ValueError:
+            return None
+    if len(_timestamp_memo) >= _TIMESTAMP_MEMO_SIZE:
+        _timestamp_memo.clear()
+    _timestamp_memo[key] = result
+    return result
+
+
 class AccessLogEntry:
     """表示單一存取記錄的類別"""
+
+    # 不使用 __dict__，大量記錄常駐記憶體時每筆可省下數百位元組
+    __slots__ = (
+        'raw_line', 'ip_address', 'timestamp', 'request', 'status_code',
+        'response_size', 'referer', 'user_agent', 'extra',
+        'method', 'url', 'protocol', 'datetime_obj'
+    )
     
     def __init__(self, line: str):
         self.raw_line = line.strip()
         self.parse_line()
     
     def parse_line(self):
-        """解析存取記錄行"""
-        # Apache/Nginx Common Log Format 正規表達式
-        pattern = r'^(\S+) \S+ \S+ \[([^\]]+)\] "([^"]*)" (\d+) (\d+|-) "([^"]*)" "([^"]*)" "([^"]*)"'
-        
-        match = re.match(pattern, self.raw_line)
+        """
+        解析存取記錄行。
+        datetime_obj 在第一次讀取時才解析，只需要計數的用途不必付出時間戳解析成本。
+        """
+        match = LOG_LINE_PATTERN.match(self.raw_line)
         if match:
-            self.ip_address = match.group(1)
-            self.timestamp = match.group(2)
-            self.request = match.group(3)
-            self.status_code = int(match.group(4))
-            self.response_size = match.group(5) if match.group(5) != '-' else 0
-            self.referer = match.group(6) if match.group(6) != '-' else None
-            self.user_agent = match.group(7) if match.group(7) != '-' else None
-            self.extra = match.group(8) if match.group(8) != '-' else None
+            ip, timestamp, request, status, size, referer, user_agent, extra = match.groups()
+            self.ip_address = ip
+            self.timestamp = timestamp
+            self.request = request
+            self.status_code = int(status)
+            self.response_size = size if size != '-' else 0
+            self.referer = referer if referer != '-' else None
+            self.user_agent = user_agent if user_agent != '-' else None
+            self.extra = extra if extra != '-' else None
             
             # 解析請求詳情
             self.parse_request()
-            
-            # 解析時間戳
-            self.parse_timestamp()
         else:
             # 處理無法解析的行
             self.ip_address = None
@@ -56,6 +136,13 @@ class AccessLogEntry:
             self.url = None
             self.protocol = None
             self.datetime_obj = None
+
+    def __getattr__(self, name):
+        # 只有尚未解析的延遲欄位會走到這裡
+        if name == 'datetime_obj':
+            self.parse_timestamp()
+            return self.datetime_obj
+        raise AttributeError(name)
     
     def parse_request(self):
         """解析HTTP請求字串"""
@@ -77,14 +164,8 @@ class AccessLogEntry:
     def parse_timestamp(self):
         """解析時間戳為datetime物件"""
         if self.timestamp:
-            try:
-                # 格式: 22/Jul/2025:01:54:28 +0000
-                self.datetime_obj = datetime.strptime(
-                    self.timestamp.split()[0], 
-                    "%d/%b/%Y:%H:%M:%S"
-                )
-            except:
-                self.datetime_obj = None
+            # 格式: 22/Jul/2025:01:54:28 +0000
+            self.datetime_obj = parse_log_timestamp(self.timestamp)
         else:
             self.datetime_obj = None
     
@@ -97,14 +178,8 @@ class AccessLogEntry:
         if not self.user_agent:
             return False
         
-        bot_indicators = [
-            'bot', 'crawler', 'spider', 'scraper', 'wget', 'curl',
-            'Googlebot', 'Bingbot', 'facebookexternalhit', 'Twitterbot',
-            'zgrab', 'CensysInspect', 'OAI-SearchBot'
-        ]
-        
         user_agent_lower = self.user_agent.lower()
-        return any(indicator.lower() in user_agent_lower for indicator in bot_indicators)
+        return any(indicator in user_agent_lower for indicator in _BOT_INDICATORS_LOWER)
     
     def get_file_extension(self) -> Optional[str]:
         """取得請求檔案的副檔名"""
@@ -116,6 +191,15 @@ class AccessLogEntry:
         if '.' in url_path:
             return url_path.split('.')[-1].lower()
         return None
+
+    def is_suspicious(self) -> bool:
+        """檢查是否為可疑請求（可疑路徑或異常狀態碼）"""
+        if not self.url:
+            return False
+        url_lower = self.url.lower()
+        if any(pattern in url_lower for pattern in SUSPICIOUS_PATTERNS):
+            return True
+        return self.status_code in SUSPICIOUS_STATUS_CODES
     
     def to_dict(self) -> Dict:
         """轉換為字典格式"""
@@ -137,15 +221,351 @@ class AccessLogEntry:
         }
 
 
+class LogAggregator:
+    """
+    串流彙總器：每筆記錄只處理一次，累加到計數器與每小時直方圖後即可丟棄。
+    記憶體只與不同 IP / URL / User Agent 的數量有關，與記錄筆數無關。
+    多個彙總器可依記錄順序 merge，結果與逐筆處理相同。
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.ip_counter = Counter()
+        self.status_counter = Counter()
+        self.url_counter = Counter()
+        self.user_agent_counter = Counter()
+        self.hourly_traffic = defaultdict(int)
+        self.file_types = Counter()
+        self.bot_count = 0
+        self.error_count = 0
+        self.suspicious_count = 0
+
+    def add(self, entry: AccessLogEntry):
+        """加入一筆有效記錄"""
+        self.total += 1
+        if entry.ip_address:
+            self.ip_counter[entry.ip_address] += 1
+        if entry.status_code:
+            self.status_counter[entry.status_code] += 1
+        if entry.url:
+            self.url_counter[entry.url] += 1
+        if entry.user_agent:
+            self.user_agent_counter[entry.user_agent] += 1
+        if entry.datetime_obj:
+            self.hourly_traffic[entry.datetime_obj.hour] += 1
+        ext = entry.get_file_extension()
+        if ext:
+            self.file_types[ext] += 1
+        if entry.is_bot():
+            self.bot_count += 1
+        if entry.status_code in ERROR_STATUS_CODES:
+            self.error_count += 1
+        if entry.is_suspicious():
+            self.suspicious_count += 1
+
+    def merge(self, other: 'LogAggregator') -> 'LogAggregator':
+        """合併另一個彙總器（other 的記錄視為排在本彙總器之後）"""
+        self.total += other.total
+        self.ip_counter.update(other.ip_counter)
+        self.status_counter.update(other.status_counter)
+        self.url_counter.update(other.url_counter)
+        self.user_agent_counter.update(other.user_agent_counter)
+        for hour, count in other.hourly_traffic.items():
+            self.hourly_traffic[hour] += count
+        self.file_types.update(other.file_types)
+        self.bot_count += other.bot_count
+        self.error_count += other.error_count
+        self.suspicious_count += other.suspicious_count
+        return self
+
+    def bot_traffic_ratio(self) -> float:
+        return self.bot_count / self.total if self.total else 0.0
+
+    def to_analysis(self) -> Dict:
+        """輸出與 AccessLogAnalyzer.analyze() 相同格式的結果"""
+        if not self.total:
+            return {"error": "沒有載入任何記錄"}
+        return {
+            "總記錄數": self.total,
+            "分析時間": datetime.now().isoformat(),
+            "前10個IP位址": self.ip_counter.most_common(10),
+            "狀態碼分佈": dict(self.status_counter),
+            "前10個請求URL": self.url_counter.most_common(10),
+            "前10個User Agent": self.user_agent_counter.most_common(10),
+            "機器人流量比例": f"{self.bot_traffic_ratio():.2%}",
+            "錯誤請求數": self.error_count,
+            "可疑請求數": self.suspicious_count,
+            "每小時流量": dict(self.hourly_traffic),
+            "檔案類型請求": dict(self.file_types)
+        }
+
+
+def split_log_ranges(path: Union[str, Path], chunks: int) -> List[Tuple[int, int]]:
+    """
+    把檔案切成約 chunks 段位元組區間 (start, end)，每段都從行首開始、在換行後結束，
+    不會把一行拆到兩段。
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    chunks = max(1, min(chunks, size))
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        for i in range(1, chunks + 1):
+            if start >= size:
+                break
+            end = size if i == chunks else max(start, size * i // chunks)
+            if end < size:
+                # 往後對齊到下一個換行
+                newline = mm.find(b'\n', end)
+                end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def aggregate_log_range(path: Union[str, Path], start: int, end: int) -> LogAggregator:
+    """
+    解析 [start, end) 區間內的記錄並回傳彙總結果。
+    以 mmap 讀取，只複製單行內容；供 ProcessPoolExecutor 的工作行程呼叫。
+    """
+    aggregator = LogAggregator()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            newline = mm.find(b'\n', pos, end)
+            line_end = end if newline == -1 else newline + 1
+            entry = AccessLogEntry(mm[pos:line_end].decode('utf-8'))
+            if entry.is_valid():
+                aggregator.add(entry)
+            pos = line_end
+    return aggregator
+
+
+class LogRow:
+    """
+    LogColumns 取出的單筆記錄，只有下列欄位（名稱與 AccessLogEntry 相同）；
+    沒有 timestamp / referer 等原始欄位，也沒有 is_bot()、get_file_extension()、to_dict()。
+    """
+
+    __slots__ = ('ip_address', 'method', 'url', 'user_agent', 'status_code', 'response_size', 'datetime_obj')
+
+    def __init__(self, ip_address, method, url, user_agent, status_code, response_size, datetime_obj):
+        self.ip_address = ip_address
+        self.method = method
+        self.url = url
+        self.user_agent = user_agent
+        self.status_code = status_code
+        self.response_size = response_size
+        self.datetime_obj = datetime_obj
+
+
+class _StringColumn:
+    """字典編碼的字串欄：相同字串只存一份，每筆記錄只存 4 bytes 的編號（0 代表 None）"""
+
+    __slots__ = ('values', 'index', 'codes')
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.index: Dict[str, int] = {}
+        self.codes = array('I')
+
+    def append(self, value: Optional[str]):
+        if value is None:
+            self.codes.append(0)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        return self.values[self.codes[row]]
+
+
+_MAX_UINT16 = 65535
+_MAX_INT64 = 2 ** 63 - 1
+
+
+class LogColumns:
+    """
+    欄式儲存的存取記錄：IP / URL / User Agent / method 以字典編碼，
+    狀態碼、回應大小與時間以數值陣列保存，篩選以 NumPy 向量化掃描。
+    回應大小一律轉為整數（'-' 視為 0）。
+    超出欄位範圍的異常值不中斷載入：狀態碼大於 65535 存為 0（視同無法解析），
+    回應大小超過 int64 時存為 int64 上限。
+    """
+
+    def __init__(self):
+        self.ip_address = _StringColumn()
+        self.method = _StringColumn()
+        self.url = _StringColumn()
+        self.user_agent = _StringColumn()
+        self.status_code = array('H')
+        self.response_size = array('q')
+        self.timestamp = array('q')  # 秒數（自 datetime.min 起算），-1 代表無法解析
+
+    def __len__(self) -> int:
+        return len(self.status_code)
+
+    def append(self, entry: AccessLogEntry):
+        self.ip_address.append(entry.ip_address)
+        self.method.append(entry.method)
+        self.url.append(entry.url)
+        self.user_agent.append(entry.user_agent)
+        status = entry.status_code or 0
+        self.status_code.append(status if status <= _MAX_UINT16 else 0)
+        size = entry.response_size
+        size = int(size) if isinstance(size, str) and size.isdigit() else 0
+        self.response_size.append(min(size, _MAX_INT64))
+        dt = entry.datetime_obj
+        self.timestamp.append(
+            (dt.toordinal() * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second) if dt else -1
+        )
+
+    def row(self, i: int) -> LogRow:
+        seconds = self.timestamp[i]
+        dt = None
+        if seconds >= 0:
+            days, rest = divmod(seconds, 86400)
+            dt = datetime.fromordinal(days).replace(hour=rest // 3600, minute=rest // 60 % 60, second=rest % 60)
+        return LogRow(
+            self.ip_address[i], self.method[i], self.url[i], self.user_agent[i],
+            self.status_code[i] or None, self.response_size[i], dt
+        )
+
+    def rows(self, indices) -> List[LogRow]:
+        return [self.row(int(i)) for i in indices]
+
+    def _status(self):
+        return np.frombuffer(self.status_code, dtype=np.uint16)
+
+    def match_status(self, status_codes) -> np.ndarray:
+        """狀態碼屬於 status_codes 的列索引"""
+        return np.flatnonzero(np.isin(self._status(), list(status_codes)))
+
+    def match_min_size(self, min_size: int) -> np.ndarray:
+        """回應大小超過 min_size 的列索引"""
+        return np.flatnonzero(np.frombuffer(self.response_size, dtype=np.int64) > min_size)
+
+    def match_suspicious(self) -> np.ndarray:
+        """可疑請求的列索引：每個不重複 URL 只比對一次關鍵字，再依編號展開"""
+        url_flags = np.array(
+            [False] + [
+                any(pattern in url.lower() for pattern in SUSPICIOUS_PATTERNS)
+                for url in self.url.values[1:]
+            ],
+            dtype=bool
+        )
+        url_codes = np.frombuffer(self.url.codes, dtype=np.uint32)
+        has_url = url_codes != 0
+        bad_status = np.isin(self._status(), SUSPICIOUS_STATUS_CODES)
+        return np.flatnonzero(has_url & (url_flags[url_codes] | bad_status))
+
+
+def entry_unique_key(entry: AccessLogEntry) -> str:
+    """資料庫去重用的唯一識別碼"""
+    return f"{entry.ip_address}_{entry.timestamp}_{entry.url}_{entry.status_code}"
+
+
+def entry_upsert(entry: AccessLogEntry) -> Tuple[Dict, Dict]:
+    """
+    回傳 upsert 用的 (filter, update)。
+    created_at 只在新增時寫入，重複匯入同一份記錄不會改動既有文件。
+    """
+    entry_data = entry.to_dict()
+    created_at = entry_data.pop('created_at')
+    unique_key = entry_unique_key(entry)
+    entry_data['unique_key'] = unique_key
+    return {'unique_key': unique_key}, {'$set': entry_data, '$setOnInsert': {'created_at': created_at}}
+
+
+class AccessLogBulkWriter:
+    """
+    批次寫入器：解析端呼叫 add() 累積 UpdateOne，每滿 batch_size 筆放進有界佇列，
+    由背景執行緒以 bulk_write(ordered=False) 寫入。
+    佇列滿時 add() 會等待，記憶體中最多只有 max_pending 批尚未寫入。
+    """
+
+    def __init__(self, collection, batch_size: int = 1000, max_pending: int = 4):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.inserted = 0   # 新增的文件數
+        self.existing = 0   # 已存在（比對到）的文件數
+        self.failed = 0
+        self._batch: List[UpdateOne] = []
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, entry: AccessLogEntry):
+        filter_doc, update = entry_upsert(entry)
+        self._batch.append(UpdateOne(filter_doc, update, upsert=True))
+        if len(self._batch) >= self.batch_size:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def close(self) -> Dict[str, int]:
+        """送出剩餘的記錄並等待寫入完成，回傳統計"""
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        self._queue.put(None)
+        self._thread.join()
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        return {'inserted': self.inserted, 'existing': self.existing, 'failed': self.failed}
+
+    def _run(self):
+        while True:
+            ops = self._queue.get()
+            if ops is None:
+                break
+            self._write(ops)
+
+    def _write(self, ops: List[UpdateOne]):
+        try:
+            result = self.collection.bulk_write(ops, ordered=False)
+            self.inserted += result.upserted_count
+            self.existing += result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            self.inserted += details.get('nUpserted', 0)
+            self.existing += details.get('nMatched', 0)
+            failed = 0
+            for err in details.get('writeErrors', []):
+                # 同一 unique_key 同時 upsert 時的重複鍵錯誤，代表文件已存在
+                if err.get('code') == 11000:
+                    self.existing += 1
+                else:
+                    failed += 1
+            if failed:
+                self.failed += failed
+                print(f"批次寫入部分失敗: {failed} 筆")
+        except Exception as e:
+            self.failed += len(ops)
+            print(f"批次寫入失敗: {e}")
+
+
 class AccessLogAnalyzer:
     """存取記錄分析器"""
     
     def __init__(self, log_file_path: str, use_database: bool = False):
         self.log_file_path = Path(log_file_path)
         self.entries: List[AccessLogEntry] = []
+        # load_log_file 時同步建立的彙總結果；串流模式下只保留這份彙總
+        self.aggregator: Optional[LogAggregator] = None
+        # columnar=True 載入時改以欄式儲存記錄
+        self.columns: Optional[LogColumns] = None
         self.stats = {}
         self.use_database = use_database
         self.db = None
+        # 最近一次寫入資料庫的統計：inserted / existing / failed
+        self.db_save_stats: Dict[str, int] = {}
         
         if use_database:
             self._init_database()
@@ -166,19 +586,9 @@ class AccessLogAnalyzer:
             return False
         
         try:
-            collection = self.db.access_logs
-            entry_data = entry.to_dict()
-            
-            # 建立唯一識別碼
-            unique_key = f"{entry.ip_address}_{entry.timestamp}_{entry.url}_{entry.status_code}"
-            entry_data['unique_key'] = unique_key
-            
+            filter_doc, update = entry_upsert(entry)
             # 使用 upsert 避免重複
-            result = collection.update_one(
-                {'unique_key': unique_key},
-                {'$set': entry_data},
-                upsert=True
-            )
+            result = self.db.access_logs.update_one(filter_doc, update, upsert=True)
             
             return result.upserted_id is not None or result.modified_count > 0
             
@@ -186,43 +596,18 @@ class AccessLogAnalyzer:
             print(f"儲存記錄失敗: {e}")
             return False
     
-    def save_all_entries_to_db(self) -> int:
-        """將所有記錄批次儲存到資料庫"""
+    def save_all_entries_to_db(self, batch_size: int = 1000) -> int:
+        """將所有記錄以 bulk_write 批次儲存到資料庫，回傳新增筆數"""
         if not self.use_database or self.db is None:
             return 0
         
-        saved_count = 0
-        collection = self.db.access_logs
-        
+        writer = AccessLogBulkWriter(self.db.access_logs, batch_size)
         try:
-            # 使用更高效的批次操作
-            batch_data = []
-            
             for entry in self.entries:
-                entry_data = entry.to_dict()
-                # 建立唯一識別碼用於去重
-                entry_data['unique_key'] = f"{entry.ip_address}_{entry.timestamp}_{entry.url}_{entry.status_code}"
-                batch_data.append(entry_data)
-            
-            if batch_data:
-                # 使用 upsert 批次操作，避免重複
-                for data in batch_data:
-                    try:
-                        result = collection.update_one(
-                            {'unique_key': data['unique_key']},
-                            {'$set': data},
-                            upsert=True
-                        )
-                        if result.upserted_id or result.modified_count > 0:
-                            saved_count += 1
-                    except Exception as e:
-                        print(f"儲存單筆記錄失敗: {e}")
-                        continue
-                
-        except Exception as e:
-            print(f"批次儲存失敗: {e}")
-        
-        return saved_count
+                writer.add(entry)
+        finally:
+            self.db_save_stats = writer.close()
+        return self.db_save_stats['inserted']
     
     def create_database_indexes(self):
         """建立資料庫索引以提升查詢效能"""
@@ -260,9 +645,37 @@ class AccessLogAnalyzer:
             print(f"從資料庫取得資料失敗: {e}")
             return []
     
-    def load_log_file(self, max_lines: Optional[int] = None, save_to_db: bool = False) -> int:
-        """載入記錄檔"""
+    def load_log_file(self, max_lines: Optional[int] = None, save_to_db: bool = False,
+                      streaming: bool = False, columnar: bool = False, workers: int = 1,
+                      db_batch_size: int = 1000) -> int:
+        """
+        載入記錄檔，並在同一次讀取中完成彙總。
+        streaming=True 時不保留個別記錄（self.entries 為空），記憶體用量不隨檔案大小成長；
+        此模式下需要個別記錄的查詢（錯誤請求清單等）會回傳空結果。
+        columnar=True 時記錄改存在 self.columns（欄式、字典編碼），查詢結果為 LogRow。
+        workers > 1 時以多個行程平行解析（等同 streaming=True），
+        指定 max_lines 或 save_to_db 時仍逐行讀取。
+        save_to_db=True 時每 db_batch_size 筆以 bulk_write 寫入一次，
+        寫入統計（新增 / 已存在 / 失敗筆數）存在 self.db_save_stats。
+        回傳有效記錄數。
+        """
         self.entries = []
+        self.aggregator = LogAggregator()
+        self.columns = LogColumns() if columnar and not streaming else None
+        self.stats = {}
+        
+        if workers > 1 and not max_lines and not save_to_db:
+            self.columns = None
+            try:
+                self.aggregator = self._load_log_file_parallel(workers)
+            except Exception as e:
+                raise Exception(f"無法載入記錄檔: {e}")
+            return self.aggregator.total
+        
+        # 選擇性儲存到資料庫：解析端直接把記錄交給批次寫入器
+        writer = None
+        if save_to_db and self.use_database and self.db is not None:
+            writer = AccessLogBulkWriter(self.db.access_logs, db_batch_size)
         
         try:
             with open(self.log_file_path, 'r', encoding='utf-8') as f:
@@ -273,87 +686,103 @@ class AccessLogAnalyzer:
                     
                     entry = AccessLogEntry(line)
                     if entry.is_valid():
-                        self.entries.append(entry)
-                        
-                        # 選擇性儲存到資料庫
-                        if save_to_db and self.use_database:
-                            self.save_entry_to_db(entry)
+                        self.aggregator.add(entry)
+                        if self.columns is not None:
+                            self.columns.append(entry)
+                        elif not streaming:
+                            self.entries.append(entry)
+                        if writer is not None:
+                            writer.add(entry)
                             
                     lines_read += 1
             
-            # 如果選擇批次儲存到資料庫
-            if save_to_db and self.use_database and self.entries:
-                saved_count = self.save_all_entries_to_db()
-                print(f"✓ 已儲存 {saved_count} 筆新記錄到資料庫")
-                
-            return len(self.entries)
+            return self.aggregator.total
         except Exception as e:
             raise Exception(f"無法載入記錄檔: {e}")
-    
+        finally:
+            if writer is not None:
+                self.db_save_stats = writer.close()
+                print(f"✓ 已儲存 {self.db_save_stats['inserted']} 筆新記錄到資料庫"
+                      f"（已存在 {self.db_save_stats['existing']} 筆，失敗 {self.db_save_stats['failed']} 筆）")
+    
+    def _load_log_file_parallel(self, workers: int) -> LogAggregator:
+        """
+        把檔案切成依換行對齊的區間，交給 workers 個行程各自解析彙總，
+        再依區間順序合併，結果（含排名同分時的順序）與逐行讀取相同。
+        """
+        # 區間數多於行程數，避免某段特別慢時其他行程閒置
+        ranges = split_log_ranges(self.log_file_path, workers * 4)
+        aggregator = LogAggregator()
+        if not ranges:
+            return aggregator
+        path = str(self.log_file_path)
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            futures = [executor.submit(aggregate_log_range, path, start, end) for start, end in ranges]
+            for future in futures:
+                aggregator.merge(future.result())
+        return aggregator
+
     def get_top_ips(self, limit: int = 10) -> List[Tuple[str, int]]:
         """取得最常存取的IP位址"""
+        if self.aggregator is not None:
+            return self.aggregator.ip_counter.most_common(limit)
         ip_counter = Counter(entry.ip_address for entry in self.entries if entry.ip_address)
         return ip_counter.most_common(limit)
     
     def get_status_code_distribution(self) -> Dict[int, int]:
         """取得狀態碼分佈"""
+        if self.aggregator is not None:
+            return dict(self.aggregator.status_counter)
         return dict(Counter(entry.status_code for entry in self.entries if entry.status_code))
     
     def get_most_requested_urls(self, limit: int = 10) -> List[Tuple[str, int]]:
         """取得最常被請求的URL"""
+        if self.aggregator is not None:
+            return self.aggregator.url_counter.most_common(limit)
         url_counter = Counter(entry.url for entry in self.entries if entry.url)
         return url_counter.most_common(limit)
     
     def get_user_agent_stats(self, limit: int = 10) -> List[Tuple[str, int]]:
         """取得User Agent統計"""
+        if self.aggregator is not None:
+            return self.aggregator.user_agent_counter.most_common(limit)
         ua_counter = Counter(entry.user_agent for entry in self.entries if entry.user_agent)
         return ua_counter.most_common(limit)
     
     def get_bot_traffic_ratio(self) -> float:
         """取得機器人流量比例"""
+        if self.aggregator is not None:
+            return self.aggregator.bot_traffic_ratio()
         if not self.entries:
             return 0.0
         
         bot_count = sum(1 for entry in self.entries if entry.is_bot())
         return bot_count / len(self.entries)
     
-    def get_error_requests(self, status_codes: List[int] = [404, 400, 403, 500, 502, 503]) -> List[AccessLogEntry]:
-        """取得錯誤請求"""
+    def get_error_requests(self, status_codes: List[int] = [404, 400, 403, 500, 502, 503]) -> Union[List[AccessLogEntry], List[LogRow]]:
+        """取得錯誤請求（columnar 模式回傳 LogRow）"""
+        if self.columns is not None:
+            return self.columns.rows(self.columns.match_status(status_codes))
         return [entry for entry in self.entries if entry.status_code in status_codes]
     
-    def get_large_responses(self, min_size: int = 1000000) -> List[AccessLogEntry]:
-        """取得大型回應"""
+    def get_large_responses(self, min_size: int = 1000000) -> Union[List[AccessLogEntry], List[LogRow]]:
+        """取得大型回應（columnar 模式回傳 LogRow）"""
+        if self.columns is not None:
+            return self.columns.rows(self.columns.match_min_size(min_size))
         return [entry for entry in self.entries 
                 if isinstance(entry.response_size, int) and entry.response_size > min_size]
     
-    def get_suspicious_requests(self) -> List[AccessLogEntry]:
-        """取得可疑請求"""
-        suspicious = []
-        
-        for entry in self.entries:
-            if not entry.url:
-                continue
-                
-            url_lower = entry.url.lower()
-            
-            # 檢查可疑路徑
-            suspicious_patterns = [
-                'shell', 'admin', 'login', 'password', 'wp-admin', 
-                'phpmyadmin', 'config', '.git', '.env', 'backup',
-                'sql', 'dump', 'exploit', 'hack'
-            ]
-            
-            if any(pattern in url_lower for pattern in suspicious_patterns):
-                suspicious.append(entry)
-            
-            # 檢查異常狀態碼
-            elif entry.status_code in [400, 401, 403, 404]:
-                suspicious.append(entry)
-        
-        return suspicious
+    def get_suspicious_requests(self) -> Union[List[AccessLogEntry], List[LogRow]]:
+        """取得可疑請求（columnar 模式回傳 LogRow）"""
+        # 可疑路徑或異常狀態碼
+        if self.columns is not None:
+            return self.columns.rows(self.columns.match_suspicious())
+        return [entry for entry in self.entries if entry.is_suspicious()]
     
     def get_hourly_traffic(self) -> Dict[int, int]:
         """取得每小時流量分佈"""
+        if self.aggregator is not None:
+            return dict(self.aggregator.hourly_traffic)
         hourly_traffic = defaultdict(int)
         
         for entry in self.entries:
@@ -364,6 +793,8 @@ class AccessLogAnalyzer:
     
     def get_file_type_requests(self) -> Dict[str, int]:
         """取得檔案類型請求統計"""
+        if self.aggregator is not None:
+            return dict(self.aggregator.file_types)
         file_types = Counter()
         
         for entry in self.entries:
@@ -374,7 +805,13 @@ class AccessLogAnalyzer:
         return dict(file_types)
     
     def analyze(self) -> Dict:
-        """執行完整分析"""
+        """執行完整分析（已載入時直接讀取彙總結果，不再逐筆掃描）"""
+        if self.aggregator is not None:
+            analysis = self.aggregator.to_analysis()
+            if "error" not in analysis:
+                self.stats = analysis
+            return analysis
+
         if not self.entries:
             return {"error": "沒有載入任何記錄"}
         
@@ -411,21 +848,24 @@ class AccessLogAnalyzer:
             "公共網路": []
         }
         
-        for entry in self.entries:
-            if not entry.ip_address:
-                continue
-                
+        if self.aggregator is not None:
+            # 計數器依首次出現順序保存 IP，與逐筆掃描結果相同
+            addresses = list(self.aggregator.ip_counter)
+        else:
+            addresses = [entry.ip_address for entry in self.entries if entry.ip_address]
+
+        for address in addresses:
             try:
-                ip = ipaddress.ip_address(entry.ip_address)
+                ip = ipaddress.ip_address(address)
                 if ip.is_private:
-                    if entry.ip_address not in ip_ranges["私有網路"]:
-                        ip_ranges["私有網路"].append(entry.ip_address)
+                    if address not in ip_ranges["私有網路"]:
+                        ip_ranges["私有網路"].append(address)
                 elif ip.is_loopback:
-                    if entry.ip_address not in ip_ranges["本地網路"]:
-                        ip_ranges["本地網路"].append(entry.ip_address)
+                    if address not in ip_ranges["本地網路"]:
+                        ip_ranges["本地網路"].append(address)
                 else:
-                    if entry.ip_address not in ip_ranges["公共網路"]:
-                        ip_ranges["公共網路"].append(entry.ip_address)
+                    if address not in ip_ranges["公共網路"]:
+                        ip_ranges["公共網路"].append(address)
             except:
                 continue
         
@@ -0,0 +1,130 @@
+"""
+Access Log Parser Benchmark
+比較舊版逐行解析（每行重建正規表達式、strptime）與目前 AccessLogEntry 的解析速度
+
+用法：python -m src.log_parser_bench access.log [最多行數]
+"""
+
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from .log_analyzer import AccessLogEntry
+
+
+class LegacyAccessLogEntry:
+    """舊版 AccessLogEntry 的解析流程（保留作為基準）"""
+
+    def __init__(self, line: str):
+        self.raw_line = line.strip()
+        self.parse_line()
+
+    def parse_line(self):
+        pattern = r'^(\S+) \S+ \S+ \[([^\]]+)\] "([^"]*)" (\d+) (\d+|-) "([^"]*)" "([^"]*)" "([^"]*)"'
+        match = re.match(pattern, self.raw_line)
+        if match:
+            self.ip_address = match.group(1)
+            self.timestamp = match.group(2)
+            self.request = match.group(3)
+            self.status_code = int(match.group(4))
+            self.response_size = match.group(5) if match.group(5) != '-' else 0
+            self.referer = match.group(6) if match.group(6) != '-' else None
+            self.user_agent = match.group(7) if match.group(7) != '-' else None
+            self.extra = match.group(8) if match.group(8) != '-' else None
+            self.parse_request()
+            self.parse_timestamp()
+        else:
+            self.ip_address = None
+            self.status_code = None
+            self.url = None
+            self.datetime_obj = None
+
+    def parse_request(self):
+        if self.request:
+            parts = self.request.split()
+            if len(parts) >= 2:
+                self.method = parts[0]
+                self.url = parts[1]
+                self.protocol = parts[2] if len(parts) > 2 else None
+            else:
+                self.method = None
+                self.url = self.request
+                self.protocol = None
+        else:
+            self.method = None
+            self.url = None
+            self.protocol = None
+
+    def parse_timestamp(self):
+        if self.timestamp:
+            try:
+                self.datetime_obj = datetime.strptime(self.timestamp.split()[0], "%d/%b/%Y:%H:%M:%S")
+            except:
+                self.datetime_obj = None
+        else:
+            self.datetime_obj = None
+
+
+def legacy_parse(line: str):
+    """舊版解析流程"""
+    entry = LegacyAccessLogEntry(line)
+    if entry.ip_address is None or entry.status_code is None:
+        return None
+    return (entry.ip_address, entry.status_code, entry.url, entry.datetime_obj)
+
+
+def current_parse(line: str):
+    """目前的解析流程（讀取與 legacy_parse 相同的欄位）"""
+    entry = AccessLogEntry(line)
+    if not entry.is_valid():
+        return None
+    return (entry.ip_address, entry.status_code, entry.url, entry.datetime_obj)
+
+
+def _time_parser(parse: Callable, lines: List[str]) -> float:
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    return time.perf_counter() - start
+
+
+def run_benchmark(log_file: str, max_lines: int = 200000, rounds: int = 3) -> dict:
+    """回傳兩種解析方式每秒可處理的行數（取多輪中最快的一次）"""
+    with open(log_file, 'r', encoding='utf-8') as f:
+        lines = [line for _, line in zip(range(max_lines), f)]
+    if not lines:
+        return {"lines": 0}
+
+    # 先確認兩者結果一致
+    for line in lines[:1000]:
+        assert legacy_parse(line) == current_parse(line), line
+
+    legacy = min(_time_parser(legacy_parse, lines) for _ in range(rounds))
+    current = min(_time_parser(current_parse, lines) for _ in range(rounds))
+    return {
+        "lines": len(lines),
+        "legacy_lines_per_sec": len(lines) / legacy,
+        "current_lines_per_sec": len(lines) / current,
+        "speedup": legacy / current,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法：python -m src.log_parser_bench access.log [最多行數]")
+        return
+    max_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    result = run_benchmark(sys.argv[1], max_lines)
+    if not result["lines"]:
+        print("記錄檔沒有內容")
+        return
+    print(f"行數: {result['lines']}")
+    print(f"舊版解析: {result['legacy_lines_per_sec']:,.0f} 行/秒")
+    print(f"目前解析: {result['current_lines_per_sec']:,.0f} 行/秒")
+    print(f"加速倍數: {result['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
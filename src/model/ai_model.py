@@ -33,6 +33,7 @@ from ..AI_Service.gemini import create_video_from_bytes as gemini_create_video_f
 from ..AI_Service.gemini import edit_image_from_bytes as gemini_edit_image
 from ..AI_Service.gemini import model_list as gemini_model_list
 from ..database import update_ai_model_config, list_ai_model_configs
+from ..jobs import submit_job
 
 COMMANDS_HELP = [
         ("!openai 內容", "詢問 GPT "),
@@ -43,7 +44,7 @@ COMMANDS_HELP = [
         ("!dalle 內容", "用 OpenAI GPT-image-2 產生圖片"),    
         ("!改圖 內容", "用 Gemini 進行圖片編輯"),
         ("!clearai", "清除 AI 聊天紀錄"),
-        ("!setmodel <service> <field> <value>", "更新 AI 模型設定"),
+        ("!setmodel <service> <field> <value>", "更新 AI 模型設定（model / image_model / history_limit / history_max_chars）"),
         ("!listmodels", "查看目前 AI 模型設定")
     ]
 
@@ -65,22 +66,26 @@ def register_handlers(app, config, db):
     def handle_summary_command(message, say):
         user_input = message['text'].replace('!ai', '').strip()    
         # 調用 OpenAI API
-        try:        
-            summary = generate_summary_dzmm(user_input)
-            say(f"{summary}", thread_ts=message['ts'])            
-        except Exception as e:        
-            say(f"非預期性問題 {e}")
+        def work():
+            try:        
+                summary = generate_summary_dzmm(user_input)
+                say(f"{summary}", thread_ts=message['ts'])            
+            except Exception as e:        
+                say(f"非預期性問題 {e}")
+        submit_job("llm", say, work, thread_ts=message['ts'])
 
     # Call OpenAI
     @app.message(re.compile(r"!openai\s+(.+)"))
     def handle_summary_command(message, say):
         user_input = message['text'].replace('!openai', '').strip()    
         # 調用 OpenAI API
-        try:        
-            summary = generate_summary_openai(user_input)
-            say(f"{summary}", thread_ts=message['ts'])            
-        except Exception as e:        
-            say(f"非預期性問題 {e}")
+        def work():
+            try:        
+                summary = generate_summary_openai(user_input)
+                say(f"{summary}", thread_ts=message['ts'])            
+            except Exception as e:        
+                say(f"非預期性問題 {e}")
+        submit_job("llm", say, work, thread_ts=message['ts'])
 
     # Call Claude
     #@app.message(re.compile(r"!claude\s+(.+)"))
@@ -98,11 +103,13 @@ def register_handlers(app, config, db):
     def handle_summary_command(message, say):
         user_input = message['text'].replace('!gemini', '').strip()    
         # 調用 gemini API
-        try:        
-            summary = generate_summary_gemini(user_input)
-            say(f"{summary}", thread_ts=message['ts'])            
-        except Exception as e:        
-            say(f"非預期性問題 {e}")
+        def work():
+            try:        
+                summary = generate_summary_gemini(user_input)
+                say(f"{summary}", thread_ts=message['ts'])            
+            except Exception as e:        
+                say(f"非預期性問題 {e}")
+        submit_job("llm", say, work, thread_ts=message['ts'])
 
     # 發送圖片函數
     def send_image(channel_id, message, say, file_path=None):        
@@ -150,8 +157,10 @@ def register_handlers(app, config, db):
     def create_image(message, say):        
         channel = message['channel']
         msg_text = re.match(r"^!畫\s+(.+)$", message['text']).group(1).strip()
-        say_text, file_name = gemini_create_image(msg_text)                        
-        send_image(channel, say_text, say, file_name)
+        def work():
+            say_text, file_name = gemini_create_image(msg_text)                        
+            send_image(channel, say_text, say, file_name)
+        submit_job("image", say, work)
 
     #!clearai
     @app.message(re.compile(r"^!clearai$"))
@@ -168,10 +177,15 @@ def register_handlers(app, config, db):
     def handle_set_model(message, say):
         match = re.match(r"^!setmodel\s+(\S+)\s+(\S+)\s+(\S+)$", message['text'])
         service, field, value = match.group(1), match.group(2), match.group(3)
-        allowed_fields = {"model", "image_model"}
+        allowed_fields = {"model", "image_model", "history_limit", "history_max_chars"}
         if field not in allowed_fields:
             say(f"❌ 不支援的欄位 `{field}`，可用：{', '.join(f'`{f}`' for f in allowed_fields)}")
             return
+        if field in ("history_limit", "history_max_chars"):
+            if not value.isdigit() or int(value) <= 0:
+                say(f"❌ `{field}` 必須是正整數")
+                return
+            value = int(value)
         ok = update_ai_model_config(db, service, field, value)
         if ok:
             say(f"✅ 已更新 `{service}` 的 `{field}` 為 `{value}`，下次呼叫 API 即生效。")
@@ -194,6 +208,8 @@ def register_handlers(app, config, db):
                 line = f"• `{service}` — model: `{model}`"
                 if image_model:
                     line += f", image_model: `{image_model}`"
+                if cfg.get("history_limit"):
+                    line += f", history_limit: `{cfg['history_limit']}`"
                 lines.append(line)
             say("\n".join(lines))
         except Exception as e:
@@ -205,17 +221,19 @@ def register_handlers(app, config, db):
         channel = message['channel']
         msg_text = re.match(r"^!dalle\s+(.+)$", message['text']).group(1).strip()
         
-        try:
-            # 回應用戶
+        def work():
+            try:
+                # 創建圖像
+                say_text, file_name = openai_create_image_dalle(msg_text, quality="medium", size="1024x1024")
+                
+                # 發送圖像到 Slack
+                send_image(channel, say_text, say, file_name)
+            except Exception as e:
+                say(f"❌ 圖像生成失敗：{e}")
+
+        # 回應用戶後交由背景佇列處理
+        if submit_job("image", say, work):
             say("🎨 GPT-image-2 正在生成圖像，請稍候...")
-            
-            # 創建圖像
-            say_text, file_name = openai_create_image_dalle(msg_text, quality="medium", size="1024x1024")
-            
-            # 發送圖像到 Slack
-            send_image(channel, say_text, say, file_name)
-        except Exception as e:
-            say(f"❌ 圖像生成失敗：{e}")
    
     # !改圖
     @app.message(re.compile(r"^!改圖\s+(.+)$"))
@@ -228,31 +246,34 @@ def register_handlers(app, config, db):
             say("請提供改圖描述，例如：!改圖 在我旁邊添加一隻可愛的羊駝")
             return
         
-        # 先回應用戶，告知改圖進行中
-        say("🎨 開始改圖，請稍候...")
-        image_bytes_list = []
-        file_name = "uploaded"
-        try:
-            # 若有附加圖片則下載（圖片為可選）
-            if 'files' in message:
-                for file_info in message['files']:
-                    file_url = file_info['url_private']
-                    file_name = file_info['name']
-                    headers = {'Authorization': f'Bearer {config["SLACK_BOT_TOKEN"]}'}
-                    response = requests.get(file_url, headers=headers)
-                    if response.status_code == 200:
-                        image_bytes_list.append(response.content)
+        def work():
+            image_bytes_list = []
+            file_name = "uploaded"
+            try:
+                # 若有附加圖片則下載（圖片為可選）
+                if 'files' in message:
+                    for file_info in message['files']:
+                        file_url = file_info['url_private']
+                        file_name = file_info['name']
+                        headers = {'Authorization': f'Bearer {config["SLACK_BOT_TOKEN"]}'}
+                        response = requests.get(file_url, headers=headers)
+                        if response.status_code == 200:
+                            image_bytes_list.append(response.content)
 
-            # 調用 Gemini 改圖／生圖功能（圖片可選）
-            result_text, file_path = gemini_edit_image(image_bytes_list, text_prompt, file_name)
+                # 調用 Gemini 改圖／生圖功能（圖片可選）
+                result_text, file_path = gemini_edit_image(image_bytes_list, text_prompt, file_name)
 
-            if file_path:
-                send_image(channel, result_text, say, file_path)
-            else:
-                say(result_text)
+                if file_path:
+                    send_image(channel, result_text, say, file_path)
+                else:
+                    say(result_text)
                 
-        except Exception as e:
-            say(f"❌ 改圖失敗：{e}")
+            except Exception as e:
+                say(f"❌ 改圖失敗：{e}")
+
+        # 先回應用戶，告知改圖進行中
+        if submit_job("image", say, work):
+            say("🎨 開始改圖，請稍候...")
 
             
 
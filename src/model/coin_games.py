@@ -0,0 +1,143 @@
+import random
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 遊戲規則（純函式，不碰資料庫）：轉盤、拉霸、抽獎的機率與派彩
+# coin_model 的指令與 economy_sim 的模擬共用同一份規則
+# ──────────────────────────────────────────────────────────────────────────────
+
+# 黃金口袋：持有時 50% 機率不扣下注金額
+FREE_COST_CHANCE = 0.5
+
+# ─── 轉盤 ────────────────────────────────────────────────────────────────────
+WHEEL_JACKPOT = "恭喜獲得 1000 幣"
+WHEEL_HALF = " :pepe_cry: 烏薩奇幣已對折"
+# 獎項 → 派彩金額（對折另外處理）
+WHEEL_REWARDS = {
+    "再接再厲": 0,
+    "恭喜獲得 10 幣": 10,
+    "恭喜獲得 20 幣": 20,
+    "恭喜獲得 50 幣": 50,
+    "恭喜獲得 100 幣": 100,
+    WHEEL_JACKPOT: 1000,
+    "謝謝參加": 0,
+    WHEEL_HALF: 0,
+}
+
+
+def weighted_wheel_options(bet):
+    """依下注金額回傳轉盤獎項與權重"""
+    # 基本獎項與權重
+    options = [
+        ("再接再厲", 30),
+        ("恭喜獲得 10 幣", 10),
+        ("恭喜獲得 20 幣", 15),
+        ("恭喜獲得 50 幣", 5 + bet // 10),   # 壓越多，機率越高
+        ("恭喜獲得 100 幣", 2 + bet // 5),  # 壓越多，機率越高
+        (WHEEL_JACKPOT, 1 + bet // 10),  # 壓越多，機率越高
+        ("謝謝參加", 20),
+        (WHEEL_HALF, 1)
+    ]
+    population = [item[0] for item in options]
+    weights = [item[1] for item in options]
+    return population, weights
+
+
+def wheel_weights(bet, spin_bonus=0):
+    """
+    套用幸運符後的轉盤獎項與權重。
+    spin_bonus >= 1 時必中大獎，只回傳大獎一項。
+    """
+    if spin_bonus >= 1:
+        return [WHEEL_JACKPOT], [1]
+    population, weights = weighted_wheel_options(bet)
+    idx_1000 = population.index(WHEEL_JACKPOT)
+    weights[idx_1000] = int(weights[idx_1000] * (1 + spin_bonus))
+    return population, weights
+
+
+def spin_wheel_result(bet, spin_bonus=0, rng=random):
+    """轉一次轉盤，回傳獎項名稱"""
+    population, weights = wheel_weights(bet, spin_bonus)
+    return rng.choices(population, weights=weights, k=1)[0]
+
+
+# ─── 拉霸 ────────────────────────────────────────────────────────────────────
+SLOT_REELS = [
+    ["🍒", "🍋", "🔔", "⭐", "💎", "7️⃣", "🍒", "🍋", "🔔", "⭐", "💎", "7️⃣"],
+    ["🍋", "🍒", "🔔", "⭐", "7️⃣", "💎", "🍋", "🍒", "🔔", "⭐", "7️⃣", "💎"],
+    ["🔔", "🍋", "🍒", "⭐", "💎", "7️⃣", "🔔", "🍋", "🍒", "⭐", "💎", "7️⃣"]
+]
+# 連線符號 → 倍率
+SLOT_MULTIPLIERS = {
+    "🍒": 5,
+    "🍋": 8,
+    "🔔": 15,
+    "⭐": 30,
+    "💎": 100,
+    "7️⃣": 200,
+}
+# 物品效果 → 被換成 7️⃣ 的符號
+SLOT_CHAIN_EFFECTS = {"slot1": "🍒", "slot2": "🍋", "slot3": "🔔"}
+# 8 條連線：(名稱, [(列, 行), ...])
+SLOT_LINES = (
+    [(f"第{i+1}橫列", [(i, 0), (i, 1), (i, 2)]) for i in range(3)]
+    + [(f"第{i+1}直行", [(0, i), (1, i), (2, i)]) for i in range(3)]
+    + [
+        ("左上到右下斜線", [(0, 0), (1, 1), (2, 2)]),
+        ("右上到左下斜線", [(0, 2), (1, 1), (2, 0)]),
+    ]
+)
+
+
+def slot_reels(chain_effects=()):
+    """依持有的連鎖物品（slot1 / slot2 / slot3）回傳調整後的輪帶"""
+    reels = [list(reel) for reel in SLOT_REELS]
+    for effect in ("slot1", "slot2", "slot3"):
+        if effect in chain_effects:
+            target = SLOT_CHAIN_EFFECTS[effect]
+            reels = [["7️⃣" if s == target else s for s in reel] for reel in reels]
+    return reels
+
+
+def slot_grid(reels, stops):
+    """每輪停在 stops 指定的位置，回傳 3x3 結果（rows[列][行]）"""
+    return [
+        [reels[col][(stops[col] + row_idx) % len(reels[col])] for col in range(3)]
+        for row_idx in range(3)
+    ]
+
+
+def spin_slot(reels, rng=random):
+    """每輪隨機停一格，組成 3x3 結果"""
+    stops = [rng.randint(0, len(reels[0]) - 1) for _ in range(3)]
+    return slot_grid(reels, stops)
+
+
+def score_slot(rows, bet):
+    """
+    計算 3x3 結果的派彩。
+    回傳 (總派彩, [(連線名稱, 符號字串, 派彩), ...])
+    """
+    total = 0
+    wins = []
+    for name, cells in SLOT_LINES:
+        symbols = [rows[r][c] for r, c in cells]
+        if symbols[0] == symbols[1] == symbols[2]:
+            amount = bet * SLOT_MULTIPLIERS[symbols[0]]
+            total += amount
+            wins.append((name, "".join(symbols), amount))
+    return total, wins
+
+
+# ─── 抽獎 ────────────────────────────────────────────────────────────────────
+LOTTERY_BASE_POOL = 1000     # 獎金池被抽中後的重設金額
+LOTTERY_DAILY_INCREASE = 500 # 每日自動增加
+LOTTERY_MAX_BET_RATE = 30    # 下注換算的中獎率上限（%）
+
+
+def lottery_win_rate(bet, lottery_bonus=0):
+    """中獎機率（%）：每 10 幣 1%，最高 30%，再加上籤王加成"""
+    win_rate = min(bet // 10, LOTTERY_MAX_BET_RATE)
+    if lottery_bonus > 0:
+        win_rate += int(lottery_bonus * 100)
+    return min(win_rate, 100)
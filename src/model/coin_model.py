@@ -1,12 +1,18 @@
 import re
 import random
+import threading
 from datetime import datetime, timedelta
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from .coin_games import (
+    FREE_COST_CHANCE, WHEEL_REWARDS, WHEEL_HALF, spin_wheel_result,
+    slot_reels, spin_slot, score_slot,
+    LOTTERY_BASE_POOL, LOTTERY_DAILY_INCREASE, lottery_win_rate,
+)
 
 COMMANDS_HELP = [
     ("!簽到", "每日簽到，獲得 100 幣"),
-    ("!金幣排行", "top 3 金幣排行榜"),
-    ("!窮鬼排行", "top 3 窮鬼排行榜"),
+    ("!金幣排行 [N]", "金幣排行榜（預設前 3 名，最多 20 名）"),
+    ("!窮鬼排行 [N]", "窮鬼排行榜（預設前 3 名，最多 20 名）"),
     ("!查幣", "查詢你目前擁有的幣"),
     ("!給幣 <@user> 數量", "轉帳幣給其他人"),
     ("!窮鬼", "沒錢時可領取 50 幣救急（僅當餘額為0時可領）"),
@@ -18,7 +24,7 @@ COMMANDS_HELP = [
     ("!抽獎 [金額]", 
      "花費 10 幣以上參加每日獎金池抽獎，花越多中獎機率越高，獎金池每日自動增加500。\n"
      "中獎機率：每 10 幣 1%，最高 30%。"),
-    ("!抽獎排行", "top 3 抽中獎金池次數排行榜"),
+    ("!抽獎排行 [N]", "抽中獎金池次數排行榜（預設前 3 名，最多 20 名）"),
     ("!獎金池", "查詢今日獎金池目前累積的金額"),
     ("!拉霸 [金額]", "花費 10 幣以上參加拉霸遊戲\n"
        "倍率說明:\n"
@@ -31,54 +37,208 @@ COMMANDS_HELP = [
     )
 ]
 
-def record_coin_change(coin_collection, user_id, amount, change_type, related_user=None):
+MAX_INT64 = 9_223_372_036_854_775_807
+
+# 排行榜用的計數欄位：異動類型 → user_balances 欄位（計算帳本筆數，與舊版彙總結果一致）
+COUNTED_CHANGE_TYPES = {
+    "poor_bonus": "poor_bonus_count",
+    "lottery_win": "lottery_win_count",
+}
+
+# 本模組需要的索引：(collection, keys, options)，由 bot_main 啟動時統一建立
+INDEXES = [
+    ("user_coins", [("user_id", 1), ("type", 1), ("date", 1)], {}),
+    ("user_coins", [("type", 1), ("date", 1)], {}),
+    ("lottery_pool", [("date", 1)], {}),
+    ("user_balances", [("user_id", 1)], {"unique": True}),
+    ("user_balances", [("coins", -1)], {}),
+] + [("user_balances", [(field, -1)], {}) for field in COUNTED_CHANGE_TYPES.values()]
+
+LEADERBOARD_DEFAULT = 3
+LEADERBOARD_MAX = 20
+
+# 背包效果快取：{user_id: (效果表, 快取到期時間)}，購買時清除
+ACTIVE_EFFECTS_TTL = 30
+_active_effects_cache = {}
+_active_effects_lock = threading.Lock()
+
+
+def _record_ledger(coin_collection, user_id, amount, change_type, related_user=None):
     """
-    將每日資料合併處理，若當日同類型紀錄已存在則合併金額，否則新增。
-    金額最大上限為 MAX_INT64，超過則只記錄到上限。
+    寫入帳本：當日同類型紀錄以單次 upsert 合併金額，不存在則新增。
+    回傳是否新增了一筆帳本紀錄。
     """
-    MAX_INT64 = 9_223_372_036_854_775_807
-    today = datetime.now().strftime("%Y-%m-%d")
-    # 限制單日單類型最大金額
-    amount = max(min(amount, MAX_INT64), -MAX_INT64)
-
-    # 查找是否已有同日同類型紀錄
+    now = datetime.now()
     query = {
         "user_id": user_id,
         "type": change_type,
-        "date": today
+        "date": now.strftime("%Y-%m-%d")
     }
     if related_user:
         if change_type == "transfer_out":
             query["to_user"] = related_user
         elif change_type == "transfer_in":
             query["from_user"] = related_user
+    result = coin_collection.update_one(
+        query,
+        {"$inc": {"coins": amount}, "$set": {"timestamp": now}},
+        upsert=True
+    )
+    return result.upserted_id is not None
 
-    existing = coin_collection.find_one(query)
-    if existing:
-        # 合併金額，並限制最大上限
-        new_amount = existing["coins"] + amount
-        new_amount = max(min(new_amount, MAX_INT64), -MAX_INT64)
-        coin_collection.update_one(
-            {"_id": existing["_id"]},
-            {"$set": {"coins": new_amount, "timestamp": datetime.now()}}
-        )
-    else:
-        record = {
+
+def record_coin_change(coin_collection, user_id, amount, change_type, related_user=None):
+    """
+    記錄金幣異動並同步累計餘額，回傳異動後的餘額。
+    單筆金額最大上限為 MAX_INT64，超過則只記錄到上限。
+    """
+    amount = max(min(amount, MAX_INT64), -MAX_INT64)
+    created = _record_ledger(coin_collection, user_id, amount, change_type, related_user)
+    # 同步累計餘額與排行榜計數
+    # 計數欄位一律 $inc（0 或 1），新用戶文件也會帶齊欄位
+    inc = {"coins": amount, **{field: 0 for field in COUNTED_CHANGE_TYPES.values()}}
+    if created and change_type in COUNTED_CHANGE_TYPES:
+        inc[COUNTED_CHANGE_TYPES[change_type]] = 1
+    balance = coin_collection.database.user_balances.find_one_and_update(
+        {"user_id": user_id},
+        {"$inc": inc, "$set": {"updated_at": datetime.now()}},
+        projection={"coins": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return balance["coins"]
+
+
+def debit_coins(coin_collection, user_id, amount, change_type, related_user=None):
+    """
+    餘額足夠時才扣款（餘額檢查與扣款為同一個原子操作），
+    成功回傳扣款後餘額，餘額不足回傳 None。
+    """
+    # 超過 int64 的金額無法寫入查詢條件，且不可能有這麼多餘額
+    if amount > MAX_INT64:
+        return None
+    balance = coin_collection.database.user_balances.find_one_and_update(
+        {"user_id": user_id, "coins": {"$gte": amount}},
+        {"$inc": {"coins": -amount}, "$set": {"updated_at": datetime.now()}},
+        projection={"coins": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if balance is None:
+        return None
+    _record_ledger(coin_collection, user_id, -amount, change_type, related_user)
+    return balance["coins"]
+
+
+def get_user_balance(coin_collection, user_id):
+    """查詢用戶目前餘額（讀取 user_balances 累計值，不需彙總整本帳）"""
+    doc = coin_collection.database.user_balances.find_one({"user_id": user_id}, {"coins": 1})
+    return doc["coins"] if doc else 0
+
+
+def get_active_effects(db, user_id):
+    """
+    一次讀取使用者背包中所有未過期的物品，合併為 {效果名稱: [各物品的效果值]}。
+    結果快取 ACTIVE_EFFECTS_TTL 秒，且不會超過最早到期物品的到期時間。
+    """
+    now = datetime.now()
+    with _active_effects_lock:
+        cached = _active_effects_cache.get(user_id)
+        if cached and now < cached[1]:
+            return cached[0]
+
+    items = db.user_shops.find(
+        {
             "user_id": user_id,
-            "type": change_type,
-            "date": today,
-            "coins": amount,
-            "timestamp": datetime.now()
-        }
-        if related_user:
-            if change_type == "transfer_out":
-                record["to_user"] = related_user
-            elif change_type == "transfer_in":
-                record["from_user"] = related_user
-        coin_collection.insert_one(record)
+            "$or": [
+                {"expire_at": None},
+                {"expire_at": {"$gt": now}}
+            ]
+        },
+        {"_id": 0, "effect": 1, "expire_at": 1}
+    )
+    effects = {}
+    valid_until = now + timedelta(seconds=ACTIVE_EFFECTS_TTL)
+    for item in items:
+        for key, value in (item.get("effect") or {}).items():
+            effects.setdefault(key, []).append(value)
+        if item.get("expire_at"):
+            valid_until = min(valid_until, item["expire_at"])
+
+    with _active_effects_lock:
+        _active_effects_cache[user_id] = (effects, valid_until)
+    return effects
+
+
+def invalidate_active_effects(user_id):
+    """背包內容異動（購買等）後清除該用戶的效果快取"""
+    with _active_effects_lock:
+        _active_effects_cache.pop(user_id, None)
+
+
+def get_leaderboard(coin_collection, field, n=LEADERBOARD_DEFAULT):
+    """
+    讀取 user_balances 上 field 最高的前 n 名（走 field 遞減索引）。
+    計數類欄位只列出大於 0 的用戶。
+    """
+    query = {} if field == "coins" else {field: {"$gt": 0}}
+    cursor = coin_collection.database.user_balances.find(
+        query, {"_id": 0, "user_id": 1, field: 1}
+    ).sort(field, -1).limit(n)
+    return [(doc["user_id"], doc.get(field, 0)) for doc in cursor]
+
+
+def rebuild_user_balances(coin_collection):
+    """
+    依 user_coins 帳本重新計算 user_balances（含排行榜計數），回傳重建的用戶數。
+    只能在沒有金幣異動時執行（啟動時、尚未接收 Slack 事件前）：
+    扣款與記帳是先 $inc 餘額再寫帳本，重建若落在兩者之間會少算或多算金幣。
+    """
+    balance_collection = coin_collection.database.user_balances
+    group = {"_id": "$user_id", "sum": {"$sum": "$coins"}}
+    for change_type, field in COUNTED_CHANGE_TYPES.items():
+        group[field] = {"$sum": {"$cond": [{"$eq": ["$type", change_type]}, 1, 0]}}
+    totals = coin_collection.aggregate([{"$group": group}])
+    now = datetime.now()
+    user_ids = []
+    ops = []
+    for t in totals:
+        user_ids.append(t["_id"])
+        ops.append(UpdateOne(
+            {"user_id": t["_id"]},
+            {"$set": {
+                "coins": t["sum"],
+                **{field: t[field] for field in COUNTED_CHANGE_TYPES.values()},
+                "updated_at": now
+            }},
+            upsert=True
+        ))
+    if ops:
+        balance_collection.bulk_write(ops, ordered=False)
+    # 移除帳本中已不存在的用戶
+    balance_collection.delete_many({"user_id": {"$nin": user_ids}})
+    return len(ops)
+
+
+def ensure_user_balances(db, force_rebuild=False):
+    """
+    首次啟用或尚無排行榜計數時由帳本回填 user_balances（索引由 INDEXES 宣告）。
+    force_rebuild=True 時一律重建，供維護時使用（設定檔 REBUILD_BALANCES_ON_START=true）。
+    """
+    balance_collection = db.user_balances
+    if db.user_coins.estimated_document_count() == 0:
+        return
+    missing_counters = balance_collection.find_one(
+        {"poor_bonus_count": {"$exists": False}}, {"_id": 1}
+    ) is not None
+    if force_rebuild or balance_collection.estimated_document_count() == 0 or missing_counters:
+        count = rebuild_user_balances(db.user_coins)
+        print(f"✅ 已由帳本回填 {count} 位用戶的餘額")
 
 
 def register_coin_handlers(app, config, db):
+    # 重建只在註冊指令前執行，此時還不會有並行的金幣異動
+    ensure_user_balances(db, force_rebuild=config.get('REBUILD_BALANCES_ON_START', '').lower() == 'true')
+
     @app.message(re.compile(r"^!coin_test$"))
     def test_command(message, say):
         #coin_collection = db.user_coins
@@ -99,9 +259,9 @@ def register_coin_handlers(app, config, db):
             return
 
         # 查詢背包是否有有效簽到好寶寶
-        shop_items = get_valid_items(user_id, db, effect_key="sign_in_bonus")
+        effects = get_active_effects(db, user_id)
         bonus = 1
-        if shop_items:
+        if effects.get("sign_in_bonus"):
             say(f"<@{user_id}>，你有簽到好寶寶，簽到金額將會倍增！")            
             bonus = 2
         amount = 100 * bonus
@@ -114,12 +274,7 @@ def register_coin_handlers(app, config, db):
     def check_coins(message, say):
         coin_collection = db.user_coins   
         user_id = message['user']
-        total = coin_collection.aggregate([
-            {"$match": {"user_id": user_id}},
-            {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-        ])
-        total = list(total)
-        coins = total[0]["sum"] if total else 0
+        coins = get_user_balance(coin_collection, user_id)
         say(f"<@{user_id}>，你目前擁有 {coins} 烏薩奇幣！")   
 
     @app.message(re.compile(r"^!給幣\s+<@(\w+)>\s+(\d+)$"))
@@ -135,57 +290,14 @@ def register_coin_handlers(app, config, db):
         if amount <= 0:
             say("轉帳金額必須大於0")
             return
-        # 計算 from_user 的總幣
-        total = coin_collection.aggregate([
-            {"$match": {"user_id": from_user}},
-            {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-        ])
-        total = list(total)
-        coins = total[0]["sum"] if total else 0
-        if coins < amount:
+        # 扣除 from_user（餘額不足時不扣款）
+        if debit_coins(coin_collection, from_user, amount, "transfer_out", related_user=to_user) is None:
             say(f"<@{from_user}>，你的餘額不足，無法轉帳！")
             return
-        # 扣除 from_user
-        record_coin_change(coin_collection, from_user, -amount, "transfer_out", related_user=to_user)
         # 增加 to_user
         record_coin_change(coin_collection, to_user, amount, "transfer_in", related_user=from_user)
         say(f"<@{from_user}> 已成功轉帳 {amount} 幣給 <@{to_user}>！")
 
-    def get_valid_items(user_id, db, effect_key=None):
-        """
-        取得使用者背包中尚未過期且未使用的有效物品。
-        可選擇只取出含特定效果的物品（effect_key）。
-        """
-        shop_collection = db.user_shops
-        now = datetime.now()
-        query = {
-            "user_id": user_id,
-            "$or": [
-                {"expire_at": None},
-                {"expire_at": {"$gt": now}}
-            ]
-        }
-        if effect_key:
-            query[f"effect.{effect_key}"] = {"$exists": True}
-        items = list(shop_collection.find(query))
-        return items 
-
-    def weighted_wheel_options(bet):
-        # 基本獎項與權重
-        options = [
-            ("再接再厲", 30),
-            ("恭喜獲得 10 幣", 10),
-            ("恭喜獲得 20 幣", 15),
-            ("恭喜獲得 50 幣", 5 + bet // 10),   # 壓越多，機率越高
-            ("恭喜獲得 100 幣", 2 + bet // 5),  # 壓越多，機率越高
-            ("恭喜獲得 1000 幣", 1 + bet // 10),  # 壓越多，機率越高
-            ("謝謝參加", 20),
-            (" :pepe_cry: 烏薩奇幣已對折", 1)
-        ]
-        population = [item[0] for item in options]
-        weights = [item[1] for item in options]
-        return population, weights
-
     @app.message(re.compile(r"^!轉盤(?:\s+(\d+))?$"))
     def spin_wheel(message, say):
         coin_collection = db.user_coins
@@ -197,70 +309,43 @@ def register_coin_handlers(app, config, db):
             say(f"<@{user_id}>，最低下注 10 枚烏薩奇幣！")
             return
         
+        # 一次讀取背包效果
+        effects = get_active_effects(db, user_id)
         # 查詢背包是否有有效黃金口袋
-        free_cost_items = get_valid_items(user_id, db, effect_key="free_cost")
         is_free = False
-        if free_cost_items:
+        if effects.get("free_cost"):
             # 50% 機率觸發不扣幣
-            if random.random() < 0.5:
+            if random.random() < FREE_COST_CHANCE:
                 say(f"<@{user_id}>，你觸發了黃金口袋，這次不扣除烏薩奇幣！")
                 is_free = True
                 
         # 查詢背包是否有有效幸運符
-        spin_bonus_items = get_valid_items(user_id, db, effect_key="spin_bonus")
-        spin_bonus = sum(item["effect"].get("spin_bonus", 0) for item in spin_bonus_items)
-        say(f"<@{user_id}>，你有 {len(spin_bonus_items)} 個幸運符，轉盤中大獎機率提升 {spin_bonus * 100}%！") if spin_bonus > 0 else None   
+        spin_bonus_values = effects.get("spin_bonus", [])
+        spin_bonus = sum(spin_bonus_values)
+        say(f"<@{user_id}>，你有 {len(spin_bonus_values)} 個幸運符，轉盤中大獎機率提升 {spin_bonus * 100}%！") if spin_bonus > 0 else None   
+        coins = None
         if not is_free:
-            # 查詢用戶現有幣
-            total = coin_collection.aggregate([
-                {"$match": {"user_id": user_id}},
-                {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-            ])
-            total = list(total)
-            coins = total[0]["sum"] if total else 0
-            if coins < bet:
+            # 扣除下注金額（餘額不足時不扣款）
+            coins = debit_coins(coin_collection, user_id, bet, "spin_wheel")
+            if coins is None:
                 say(f"<@{user_id}>，你的烏薩奇幣不足，無法下注 {bet} 枚！")
                 return
-            # 扣除下注金額
-            record_coin_change(coin_collection, user_id, -bet, "spin_wheel", related_user=None)
-        # 動態設定機率
-        population, weights = weighted_wheel_options(bet)
-        idx_1000 = population.index("恭喜獲得 1000 幣")
-        if spin_bonus >= 1:
-            # 100% 中大獎
-            result = "恭喜獲得 1000 幣"
-        else:
-            weights[idx_1000] = int(weights[idx_1000] * (1 + spin_bonus))
-            result = random.choices(population, weights=weights, k=1)[0]     
+        # 依下注金額與幸運符轉盤（幸運符加成 100% 時必中大獎）
+        result = spin_wheel_result(bet, spin_bonus)
         # 發獎
-        if "1000 幣" in result:
-            record_coin_change(coin_collection, user_id, 1000, "spin_wheel_reward")
-        elif "10 幣" in result:
-            record_coin_change(coin_collection, user_id, 10, "spin_wheel_reward")
-        elif "20 幣" in result:
-            record_coin_change(coin_collection, user_id, 20, "spin_wheel_reward")
-        elif "50 幣" in result:
-            record_coin_change(coin_collection, user_id, 50, "spin_wheel_reward")
-        elif "100 幣" in result:
-            record_coin_change(coin_collection, user_id, 100, "spin_wheel_reward")
-        elif "對折" in result:
+        reward = WHEEL_REWARDS[result]
+        if reward > 0:
+            coins = record_coin_change(coin_collection, user_id, reward, "spin_wheel_reward")
+        elif result == WHEEL_HALF:
             # 對折
-            total = coin_collection.aggregate([
-                {"$match": {"user_id": user_id}},
-                {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-            ])
-            total = list(total)
-            coins = total[0]["sum"] if total else 0
+            if coins is None:
+                coins = get_user_balance(coin_collection, user_id)
             if coins > 0:
                 half = coins // 2
-                record_coin_change(coin_collection, user_id, -half, "spin_wheel_half")
-        # 查詢最新剩餘金額
-        total = coin_collection.aggregate([
-            {"$match": {"user_id": user_id}},
-            {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-        ])
-        total = list(total)
-        coins = total[0]["sum"] if total else 0
+                coins = debit_coins(coin_collection, user_id, half, "spin_wheel_half")
+        # 查詢最新剩餘金額（沒有任何異動時才需要查詢）
+        if coins is None:
+            coins = get_user_balance(coin_collection, user_id)
         say(f"<@{user_id}> 轉盤結果：{result}\n你目前剩餘 {coins} 枚烏薩奇幣。")
 
 
@@ -268,15 +353,10 @@ def register_coin_handlers(app, config, db):
     def poor_user(message, say):
         coin_collection = db.user_coins
         user_id = message['user']
-        # 查詢用戶現有幣
-        total = coin_collection.aggregate([
-            {"$match": {"user_id": user_id}},
-            {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-        ])
-        total = list(total)
-        coins = total[0]["sum"] if total else 0
-        # 查詢已用幾次窮鬼
-        used_count = coin_collection.count_documents({"user_id": user_id, "type": "poor_bonus"})
+        # 查詢用戶現有幣與已用幾次窮鬼
+        doc = db.user_balances.find_one({"user_id": user_id}, {"coins": 1, "poor_bonus_count": 1}) or {}
+        coins = doc.get("coins", 0)
+        used_count = doc.get("poor_bonus_count", 0)
         if coins == 0:
             record_coin_change(coin_collection, user_id, 50, "poor_bonus")
             used_count += 1
@@ -284,65 +364,43 @@ def register_coin_handlers(app, config, db):
         else:
             say(f"<@{user_id}>，你還有 {coins} 枚烏薩奇幣，暫時不能領救濟金喔！")
 
-    @app.message(re.compile(r"^!金幣排行$"))
+    def leaderboard_size(message, pattern):
+        n = re.match(pattern, message['text']).group(1)
+        return max(1, min(int(n), LEADERBOARD_MAX)) if n else LEADERBOARD_DEFAULT
+
+    @app.message(re.compile(r"^!金幣排行(?:\s+(\d+))?$"))
     def coin_leaderboard(message, say):
-        coin_collection = db.user_coins
-        # 聚合查詢所有用戶總金幣，排序取前三
-        leaderboard = coin_collection.aggregate([
-            {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}},
-            {"$sort": {"sum": -1}},
-            {"$limit": 3}
-        ])
-        leaderboard = list(leaderboard)
+        n = leaderboard_size(message, r"^!金幣排行(?:\s+(\d+))?$")
+        leaderboard = get_leaderboard(db.user_coins, "coins", n)
         if not leaderboard:
             say("目前沒有金幣紀錄。")
             return
-        msg = "*烏薩奇幣排行榜（前 3 名）*\n"
-        for idx, entry in enumerate(leaderboard, 1):
-            user_id = entry["_id"]
-            coins = entry["sum"]
+        msg = f"*烏薩奇幣排行榜（前 {n} 名）*\n"
+        for idx, (user_id, coins) in enumerate(leaderboard, 1):
             msg += f"{idx}. <@{user_id}>：{coins} 枚\n"
         say(msg)
 
-    @app.message(re.compile(r"^!窮鬼排行$"))
+    @app.message(re.compile(r"^!窮鬼排行(?:\s+(\d+))?$"))
     def poor_leaderboard(message, say):
-        coin_collection = db.user_coins
-        # 聚合查詢所有用戶 poor_bonus 次數，排序取前三
-        leaderboard = coin_collection.aggregate([
-            {"$match": {"type": "poor_bonus"}},
-            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 3}
-        ])
-        leaderboard = list(leaderboard)
+        n = leaderboard_size(message, r"^!窮鬼排行(?:\s+(\d+))?$")
+        leaderboard = get_leaderboard(db.user_coins, "poor_bonus_count", n)
         if not leaderboard:
             say("目前沒有窮鬼紀錄。")
             return
-        msg = "*窮鬼排行榜（前 3 名，使用 !窮鬼 救濟次數）*\n"
-        for idx, entry in enumerate(leaderboard, 1):
-            user_id = entry["_id"]
-            count = entry["count"]
+        msg = f"*窮鬼排行榜（前 {n} 名，使用 !窮鬼 救濟次數）*\n"
+        for idx, (user_id, count) in enumerate(leaderboard, 1):
             msg += f"{idx}. <@{user_id}>：{count} 次\n"
         say(msg)        
 
-    @app.message(re.compile(r"^!抽獎排行$"))
+    @app.message(re.compile(r"^!抽獎排行(?:\s+(\d+))?$"))
     def lottery_leaderboard(message, say):
-        coin_collection = db.user_coins
-        # 聚合查詢所有用戶 lottery_win 次數，排序取前三
-        leaderboard = coin_collection.aggregate([
-            {"$match": {"type": "lottery_win"}},
-            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 3}
-        ])
-        leaderboard = list(leaderboard)
+        n = leaderboard_size(message, r"^!抽獎排行(?:\s+(\d+))?$")
+        leaderboard = get_leaderboard(db.user_coins, "lottery_win_count", n)
         if not leaderboard:
             say("目前沒有抽獎中獎紀錄。")
             return
-        msg = "*抽獎中獎排行榜（前 3 名，抽中獎金池次數）*\n"
-        for idx, entry in enumerate(leaderboard, 1):
-            user_id = entry["_id"]
-            count = entry["count"]
+        msg = f"*抽獎中獎排行榜（前 {n} 名，抽中獎金池次數）*\n"
+        for idx, (user_id, count) in enumerate(leaderboard, 1):
             msg += f"{idx}. <@{user_id}>：{count} 次\n"
         say(msg)
 
@@ -356,10 +414,10 @@ def register_coin_handlers(app, config, db):
         winner = coin_collection.find_one({"type": "lottery_win", "date": today})
         if winner:
             winner_id = winner["user_id"]
-            amount = pool["amount"] if pool else 1000
+            amount = pool["amount"] if pool else LOTTERY_BASE_POOL
             say(f"今日獎金池已被 <@{winner_id}> 抽中！目前獎金池重設為 {amount} 枚烏薩奇幣。")
         else:
-            amount = pool["amount"] if pool else 1000
+            amount = pool["amount"] if pool else LOTTERY_BASE_POOL
             say(f"今日獎金池目前累積：{amount} 枚烏薩奇幣！")
 
     @app.message(re.compile(r"^!抽獎(?:\s+(\d+))?$"))
@@ -381,32 +439,24 @@ def register_coin_handlers(app, config, db):
         if bet < 10:
             say(f"<@{user_id}>，最低下注 10 枚烏薩奇幣！")
             return
+        # 一次讀取背包效果
+        effects = get_active_effects(db, user_id)
         # 查詢背包是否有有效黃金口袋
-        free_cost_items = get_valid_items(user_id, db, effect_key="free_cost")
         is_free = False
-        if free_cost_items:
+        if effects.get("free_cost"):
             # 50% 機率觸發不扣幣
-            if random.random() < 0.5:
+            if random.random() < FREE_COST_CHANCE:
                 say(f"<@{user_id}>，你觸發了黃金口袋，這次不扣除烏薩奇幣！")
                 is_free = True
 
         # 查詢背包是否有籤王
-        lottery_bonus_items = get_valid_items(user_id, db, effect_key="lottery_bonus")
-        lottery_bonus = sum(item["effect"].get("lottery_bonus", 0) for item in lottery_bonus_items)        
+        lottery_bonus = sum(effects.get("lottery_bonus", []))
 
         if not is_free:
-            # 查詢用戶現有幣
-            total = coin_collection.aggregate([
-                {"$match": {"user_id": user_id}},
-                {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-            ])
-            total = list(total)
-            coins = total[0]["sum"] if total else 0
-            if coins < bet:
+            # 扣除下注金額（餘額不足時不扣款）
+            if debit_coins(coin_collection, user_id, bet, "lottery") is None:
                 say(f"<@{user_id}>，你的烏薩奇幣不足，無法下注 {bet} 枚！")
                 return
-            # 扣除下注金額
-            record_coin_change(coin_collection, user_id, -bet, "lottery", related_user=None)
 
         # 取得今日獎金池
         pool = pool_collection.find_one({"date": today})
@@ -414,8 +464,8 @@ def register_coin_handlers(app, config, db):
             # 若今天第一次抽，獎金池設為昨日獎金池+預設每日增加額
             yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
             y_pool = pool_collection.find_one({"date": yesterday})
-            base = y_pool["amount"] if y_pool else 1000
-            pool_collection.insert_one({"date": today, "amount": base + 500})  # 每日自動增加500
+            base = y_pool["amount"] if y_pool else LOTTERY_BASE_POOL
+            pool_collection.insert_one({"date": today, "amount": base + LOTTERY_DAILY_INCREASE})  # 每日自動增加500
             pool = pool_collection.find_one({"date": today})
 
         # 把本次下注金額加進獎金池
@@ -424,10 +474,7 @@ def register_coin_handlers(app, config, db):
         jackpot = pool["amount"]
 
         # 計算中獎機率（每10幣1%，最高30%）
-        win_rate = min(bet // 10, 30)
-        if lottery_bonus > 0:
-            win_rate += int(lottery_bonus * 100)
-        win_rate = min(win_rate, 100)   
+        win_rate = lottery_win_rate(bet, lottery_bonus)
         
         is_win = random.randint(1, 100) <= win_rate
 
@@ -436,7 +483,7 @@ def register_coin_handlers(app, config, db):
             record_coin_change(coin_collection, user_id, jackpot, "lottery_win")
             say(f"🎉 <@{user_id}> 恭喜你以 {bet} 幣抽中今日獎金池 {jackpot} 幣！")
             # 重設獎金池
-            pool_collection.update_one({"date": today}, {"$set": {"amount": 1000}})
+            pool_collection.update_one({"date": today}, {"$set": {"amount": LOTTERY_BASE_POOL}})
         else:
             say(f"<@{user_id}> 很可惜沒中獎，今日獎金池已累積 {jackpot} 幣！\n(你花越多，中獎機率越高，投注300枚 最高30%)")
 
@@ -451,125 +498,47 @@ def register_coin_handlers(app, config, db):
             say(f"<@{user_id}>，最低下注 10 枚烏薩奇幣！")
             return
 
+        # 一次讀取背包效果
+        effects = get_active_effects(db, user_id)
         # 查詢背包是否有有效黃金口袋
-        free_cost_items = get_valid_items(user_id, db, effect_key="free_cost")
         is_free = False
-        if free_cost_items:
+        if effects.get("free_cost"):
             # 50% 機率觸發不扣幣
-            if random.random() < 0.5:
+            if random.random() < FREE_COST_CHANCE:
                 say(f"<@{user_id}>，你觸發了黃金口袋，這次不扣除烏薩奇幣！")
                 is_free = True
 
+        coins = None
         if not is_free:
-            # 查詢用戶現有幣
-            total = coin_collection.aggregate([
-                {"$match": {"user_id": user_id}},
-                {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-            ])
-            total = list(total)
-            coins = total[0]["sum"] if total else 0
-            if coins < bet:
+            # 扣除下注金額（餘額不足時不扣款）
+            coins = debit_coins(coin_collection, user_id, bet, "slot_machine")
+            if coins is None:
                 say(f"<@{user_id}>，你的烏薩奇幣不足，無法下注 {bet} 枚！")
                 return
-            # 扣除下注金額
-            record_coin_change(coin_collection, user_id, -bet, "slot_machine", related_user=None)
-
-        # 查詢背包是否有拉霸🍒連鎖或拉霸🍋連鎖
-        slot1_items = get_valid_items(user_id, db, effect_key="slot1")
-        slot2_items = get_valid_items(user_id, db, effect_key="slot2")
-        slot3_items = get_valid_items(user_id, db, effect_key="slot3")
-        has_slot1 = bool(slot1_items)
-        has_slot2 = bool(slot2_items)
-        has_slot3 = bool(slot3_items)
-
-        # 拉霸輪帶設定（每一輪一個順序表）
-        reel = [
-            ["🍒", "🍋", "🔔", "⭐", "💎", "7️⃣", "🍒", "🍋", "🔔", "⭐", "💎", "7️⃣"],
-            ["🍋", "🍒", "🔔", "⭐", "7️⃣", "💎", "🍋", "🍒", "🔔", "⭐", "7️⃣", "💎"],
-            ["🔔", "🍋", "🍒", "⭐", "💎", "7️⃣", "🔔", "🍋", "🍒", "⭐", "💎", "7️⃣"]
-        ]
-        # 物品效果：將🍒改為7️⃣
-        if has_slot1:
-            for i in range(3):
-                reel[i] = ["7️⃣" if s == "🍒" else s for s in reel[i]]
-        # 物品效果：將🍋改為7️⃣
-        if has_slot2:
-            for i in range(3):
-                reel[i] = ["7️⃣" if s == "🍋" else s for s in reel[i]]
-        # 物品效果：將🔔改為7️⃣
-        if has_slot3:
-            for i in range(3):
-                reel[i] = ["7️⃣" if s == "🔔" else s for s in reel[i]]                
+
+        # 查詢背包是否有拉霸🍒 / 🍋 / 🔔連鎖，將對應符號改為7️⃣
+        reels = slot_reels(effects)
 
         # 每輪隨機停一格，組成 3x3 結果
-        stops = [random.randint(0, len(reel[0]) - 1) for _ in range(3)]
-        rows = []
-        for row_idx in range(3):
-            row = []
-            for col in range(3):
-                # 輪帶環狀取值
-                symbol = reel[col][(stops[col] + row_idx) % len(reel[col])]
-                row.append(symbol)
-            rows.append(row)
-
-        payout = {
-            "🍒🍒🍒": bet * 5,
-            "🍋🍋🍋": bet * 8,
-            "🔔🔔🔔": bet * 15,
-            "⭐⭐⭐": bet * 30,
-            "💎💎💎": bet * 100,
-            "7️⃣7️⃣7️⃣": bet * 200
-        }
+        rows = spin_slot(reels)
 
         msg = f"<@{user_id}> 🎰 拉霸結果：\n"
         for row in rows:
             msg += " ".join(row) + "\n"
 
-        win_amount = 0
-        win_msgs = []
-
-        # 所有橫列
-        for i, row in enumerate(rows):
-            row_str = "".join(row)
-            amount = payout.get(row_str, 0)
-            if amount > 0:
-                win_amount += amount
-                win_msgs.append(f"第{i+1}橫列中獎：{row_str}，獲得 {amount} 幣")
-
-        # 所有直行
-        for col in range(3):
-            col_str = rows[0][col] + rows[1][col] + rows[2][col]
-            amount = payout.get(col_str, 0)
-            if amount > 0:
-                win_amount += amount
-                win_msgs.append(f"第{col+1}直行中獎：{col_str}，獲得 {amount} 幣")
-
-        # 兩條斜線
-        diag1 = rows[0][0] + rows[1][1] + rows[2][2]
-        amount_diag1 = payout.get(diag1, 0)
-        if amount_diag1 > 0:
-            win_amount += amount_diag1
-            win_msgs.append(f"左上到右下斜線中獎：{diag1}，獲得 {amount_diag1} 幣")
-
-        diag2 = rows[0][2] + rows[1][1] + rows[2][0]
-        amount_diag2 = payout.get(diag2, 0)
-        if amount_diag2 > 0:
-            win_amount += amount_diag2
-            win_msgs.append(f"右上到左下斜線中獎：{diag2}，獲得 {amount_diag2} 幣")
+        # 橫列、直行與兩條斜線
+        win_amount, wins = score_slot(rows, bet)
+        win_msgs = [f"{name}中獎：{line}，獲得 {amount} 幣" for name, line, amount in wins]
 
         if win_amount > 0:
-            record_coin_change(coin_collection, user_id, win_amount, "slot_machine_win")
+            coins = record_coin_change(coin_collection, user_id, win_amount, "slot_machine_win")
             msg += "\n" + "\n".join(win_msgs)
             msg += f"\n總共獲得 {win_amount} 枚烏薩奇幣！"
         else:
             msg += "可惜沒中獎，再接再厲！"
 
-        # 查詢最新剩餘金額
-        total = coin_collection.aggregate([
-            {"$match": {"user_id": user_id}},
-            {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-        ])
-        total = list(total)
-        coins = total[0]["sum"] if total else 0
+        # 查詢最新剩餘金額（沒有任何異動時才需要查詢）
+        if coins is None:
+            coins = get_user_balance(coin_collection, user_id)
         msg += f"\n你目前剩餘 {coins} 枚烏薩奇幣。"
         say(msg)
\ No newline at end of file
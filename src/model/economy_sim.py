@@ -0,0 +1,191 @@
+"""
+金幣經濟離線模擬：以 NumPy 向量化大量模擬轉盤、拉霸、抽獎，
+計算 RTP（派彩 / 實際扣款）、每局淨收益變異數與金幣淨增加速度。
+
+用法：python -m src.model.economy_sim --spins 1000000 --bets 10 100 1000
+"""
+import argparse
+import numpy as np
+
+from .coin_games import (
+    FREE_COST_CHANCE, WHEEL_REWARDS, WHEEL_HALF, wheel_weights,
+    SLOT_MULTIPLIERS, SLOT_LINES, slot_reels,
+    LOTTERY_BASE_POOL, LOTTERY_DAILY_INCREASE, lottery_win_rate,
+)
+
+BATCH_SIZE = 1_000_000  # 每批模擬局數，控制記憶體用量
+
+
+def _summarize(game, bet, charged, payout, **params):
+    """由每局扣款與派彩計算統計值"""
+    net = payout - charged  # 玩家每局淨收益，正值代表系統新增金幣
+    total_charged = charged.sum()
+    return {
+        "game": game,
+        "bet": bet,
+        **params,
+        "plays": int(net.size),
+        "rtp": float(payout.sum() / total_charged) if total_charged else float("inf"),
+        "variance": float(net.var()),
+        "coin_creation_per_play": float(net.mean()),
+        "hit_rate": float((payout > 0).mean()),
+    }
+
+
+def _batches(n):
+    while n > 0:
+        size = min(n, BATCH_SIZE)
+        yield size
+        n -= size
+
+
+def _charged(rng, size, bet, free_cost):
+    """每局實際扣款；持有黃金口袋時有 FREE_COST_CHANCE 機率免扣"""
+    charged = np.full(size, bet, dtype=np.int64)
+    if free_cost:
+        charged[rng.random(size) < FREE_COST_CHANCE] = 0
+    return charged
+
+
+def simulate_wheel(bet, spins, spin_bonus=0.0, balance=1000, free_cost=False, rng=None):
+    """
+    模擬轉盤。對折獎項以「下注後餘額 balance」計算損失（每局皆以相同餘額起算）。
+    """
+    rng = rng or np.random.default_rng()
+    population, weights = wheel_weights(bet, spin_bonus)
+    probs = np.asarray(weights, dtype=np.float64)
+    probs /= probs.sum()
+    rewards = np.array([WHEEL_REWARDS[p] for p in population], dtype=np.int64)
+    half_idx = population.index(WHEEL_HALF) if WHEEL_HALF in population else -1
+
+    charged_all, payout_all = [], []
+    for size in _batches(spins):
+        charged = _charged(rng, size, bet, free_cost)
+        idx = rng.choice(len(population), size=size, p=probs)
+        payout = rewards[idx]
+        if half_idx >= 0:
+            payout = np.where(idx == half_idx, -(balance // 2), payout)
+        charged_all.append(charged)
+        payout_all.append(payout)
+    return _summarize(
+        "wheel", bet, np.concatenate(charged_all), np.concatenate(payout_all),
+        spin_bonus=spin_bonus, free_cost=free_cost,
+    )
+
+
+def _slot_tables(chain_effects):
+    """把輪帶符號轉成整數編碼，並建立倍率表與連線座標"""
+    reels = slot_reels(chain_effects)
+    symbols = list(SLOT_MULTIPLIERS)
+    codes = np.array([[symbols.index(s) for s in reel] for reel in reels], dtype=np.int8)
+    multipliers = np.array([SLOT_MULTIPLIERS[s] for s in symbols], dtype=np.int64)
+    line_rows = np.array([[r for r, _ in cells] for _, cells in SLOT_LINES])
+    line_cols = np.array([[c for _, c in cells] for _, cells in SLOT_LINES])
+    return codes, multipliers, line_rows, line_cols
+
+
+def simulate_slot(bet, spins, chain_effects=(), free_cost=False, rng=None):
+    """模擬拉霸；chain_effects 為持有的連鎖物品（slot1 / slot2 / slot3）"""
+    rng = rng or np.random.default_rng()
+    codes, multipliers, line_rows, line_cols = _slot_tables(chain_effects)
+    reel_len = codes.shape[1]
+    offsets = np.arange(3)
+
+    charged_all, payout_all = [], []
+    for size in _batches(spins):
+        charged = _charged(rng, size, bet, free_cost)
+        stops = rng.integers(0, reel_len, size=(size, 3))
+        # grid[局, 列, 行] = 第「行」輪停在 stop + 列 的符號
+        positions = (stops[:, None, :] + offsets[None, :, None]) % reel_len
+        grid = codes[np.arange(3)[None, None, :], positions]
+        # cells[局, 連線, 3 格]
+        cells = grid[:, line_rows, line_cols]
+        hit = (cells[..., 0] == cells[..., 1]) & (cells[..., 1] == cells[..., 2])
+        payout = (multipliers[cells[..., 0]] * hit).sum(axis=1) * bet
+        charged_all.append(charged)
+        payout_all.append(payout)
+    return _summarize(
+        "slot", bet, np.concatenate(charged_all), np.concatenate(payout_all),
+        chain_effects="+".join(sorted(chain_effects)) or "-", free_cost=free_cost,
+    )
+
+
+def simulate_lottery(bet, days, plays_per_day=20, lottery_bonus=0.0, base_pool=None,
+                     free_cost=False, rng=None):
+    """
+    模擬抽獎：每天最多 plays_per_day 次下注，有人中獎後當天停止。
+    獎金池 = 當日起始金額 + 已下注金額（含中獎者本次下注）。
+    base_pool 省略時以「重設金額 + 每日增加額」作為當日起始。
+    """
+    rng = rng or np.random.default_rng()
+    if base_pool is None:
+        base_pool = LOTTERY_BASE_POOL + LOTTERY_DAILY_INCREASE
+    win_prob = lottery_win_rate(bet, lottery_bonus) / 100
+
+    charged_all, payout_all = [], []
+    for size in _batches(days):
+        wins = rng.random((size, plays_per_day)) < win_prob
+        has_win = wins.any(axis=1)
+        first_win = np.where(has_win, wins.argmax(axis=1), plays_per_day - 1)
+        # 每天以一筆記錄：實際下注次數、總扣款與派彩
+        plays = first_win + 1
+        charged = _charged(rng, size * plays_per_day, bet, free_cost).reshape(size, plays_per_day)
+        played = np.arange(plays_per_day)[None, :] < plays[:, None]
+        day_charged = (charged * played).sum(axis=1)
+        jackpot = base_pool + plays * bet
+        payout = np.where(has_win, jackpot, 0)
+        charged_all.append(day_charged)
+        payout_all.append(payout)
+    result = _summarize(
+        "lottery", bet, np.concatenate(charged_all), np.concatenate(payout_all),
+        lottery_bonus=lottery_bonus, free_cost=free_cost,
+    )
+    # 抽獎以「天」為單位統計（plays 為模擬天數）
+    result["unit"] = "day"
+    return result
+
+
+def rtp_report(bets=(10, 100, 1000), spins=1_000_000, days=100_000, seed=None):
+    """跑過各下注金額與物品組合，回傳結果列表"""
+    rng = np.random.default_rng(seed)
+    results = []
+    for bet in bets:
+        for spin_bonus in (0.0, 0.05, 0.25):
+            results.append(simulate_wheel(bet, spins, spin_bonus=spin_bonus, rng=rng))
+        for chain in ((), ("slot1",), ("slot2",), ("slot3",), ("slot1", "slot2", "slot3")):
+            results.append(simulate_slot(bet, spins, chain_effects=chain, rng=rng))
+        results.append(simulate_slot(bet, spins, free_cost=True, rng=rng))
+        for lottery_bonus in (0.0, 0.05):
+            results.append(simulate_lottery(bet, days, lottery_bonus=lottery_bonus, rng=rng))
+    return results
+
+
+def format_report(results):
+    """把結果整理成文字表格"""
+    lines = [f"{'遊戲':<8}{'下注':>6}  {'條件':<22}{'RTP':>9}{'每局淨增幣':>14}{'變異數':>18}{'中獎率':>9}"]
+    for r in results:
+        if r["game"] == "wheel":
+            cond = f"spin_bonus={r['spin_bonus']}"
+        elif r["game"] == "slot":
+            cond = f"chain={r['chain_effects']}" + (" free_cost" if r["free_cost"] else "")
+        else:
+            cond = f"lottery_bonus={r['lottery_bonus']} (每日)"
+        lines.append(
+            f"{r['game']:<8}{r['bet']:>6}  {cond:<22}{r['rtp']:>9.4f}"
+            f"{r['coin_creation_per_play']:>14.2f}{r['variance']:>18.1f}{r['hit_rate']:>9.4f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="金幣經濟 Monte Carlo 模擬")
+    parser.add_argument("--bets", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--spins", type=int, default=1_000_000, help="轉盤 / 拉霸每組條件的模擬局數")
+    parser.add_argument("--days", type=int, default=100_000, help="抽獎模擬天數")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    print(format_report(rtp_report(args.bets, args.spins, args.days, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
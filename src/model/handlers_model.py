@@ -14,6 +14,7 @@ from math import comb
 from datetime import datetime, timedelta
 
 from ..AI_Service.ai_tool import search_threads
+from ..jobs import submit_job
 
 
 COMMANDS_HELP = [    
@@ -24,20 +25,74 @@ COMMANDS_HELP = [
     ("!remove 指令", "刪除自訂指令")
 ]
 
+# 本模組需要的索引：(collection, keys, options)，由 bot_main 啟動時統一建立
+INDEXES = [
+    ("slock_bot_commit", [("message", 1), ("is_sys", 1)], {}),
+    ("slock_bot_commit", [("is_sys", 1)], {}),
+]
+
+
+class KeywordIndex:
+    """
+    slock_bot_commit 關鍵字索引。
+    將所有關鍵字編譯成單一正規表達式並保留在記憶體，
+    每則訊息只需掃描一次文字，不必查詢資料庫。
+    新增/刪除指令時立即重建，另每 REFRESH_INTERVAL 秒重新載入一次，
+    以涵蓋直接寫入資料庫的系統指令。
+    """
+    REFRESH_INTERVAL = 300
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._lock = Lock()
+        self._pattern = None
+        self._docs = {}
+        self._loaded_at = 0
+
+    def rebuild(self):
+        """從資料庫重新載入關鍵字並編譯"""
+        docs = {}
+        for doc in self.collection.find({}, {"_id": 0}):
+            message_text = doc.get('message')
+            # 同一關鍵字以資料庫順序中第一筆為準
+            if message_text and message_text not in docs:
+                docs[message_text] = doc
+        # 依資料庫順序組成交替式，同一位置優先匹配較早的關鍵字
+        pattern = re.compile("|".join(re.escape(k) for k in docs)) if docs else None
+        with self._lock:
+            self._docs = docs
+            self._pattern = pattern
+            self._loaded_at = time.time()
+
+    def match(self, text):
+        """回傳第一個出現在 text 中的關鍵字資料，找不到時回傳 None"""
+        if time.time() - self._loaded_at >= self.REFRESH_INTERVAL:
+            self.rebuild()
+        with self._lock:
+            pattern, docs = self._pattern, self._docs
+        if pattern is None:
+            return None
+        m = pattern.search(text)
+        return docs[m.group(0)] if m else None
+
+
 def register_handlers(app, config, db):
+    keyword_index = KeywordIndex(db.slock_bot_commit)
 
     # !threads 搜尋 
     @app.message(re.compile(r"^!threads\s+(.+)$"))
     def handle_threads_search(message, say):
         query = re.match(r"^!threads\s+(.+)$", message['text']).group(1).strip()
         
-        try:                                    
-            result = search_threads(query, max_results=10)
-            # 直接回傳格式化後的結果
-            say(f"{result}", thread_ts=message['ts'])                        
-                
-        except Exception as e:
-            say(f"❌ 搜尋 Threads 時發生錯誤：{e}", thread_ts=message['ts'])
+        def work():
+            try:                                    
+                result = search_threads(query, max_results=10)
+                # 直接回傳格式化後的結果
+                say(f"{result}", thread_ts=message['ts'])                        
+                    
+            except Exception as e:
+                say(f"❌ 搜尋 Threads 時發生錯誤：{e}", thread_ts=message['ts'])
+        submit_job("browser", say, work, thread_ts=message['ts'])
 
 
     # !曬卡
@@ -158,6 +213,7 @@ def register_handlers(app, config, db):
             else:
                 # 新增指令
                 collection.insert_one({"message": message_text, "say": response_text, "is_sys": "N"})
+                keyword_index.rebuild()
                 say("指令已新增!")            
         except Exception as e:
             # 異常處理
@@ -172,6 +228,7 @@ def register_handlers(app, config, db):
             # 刪除指令
             result = collection.delete_many({"message": message_text, "is_sys": "N"})
             if result.deleted_count > 0:
+                keyword_index.rebuild()
                 say("指令已刪除!")                        
             else:
                 say("未找到相關指令!")
@@ -206,20 +263,16 @@ def register_handlers(app, config, db):
             say("目前無此指令功能!")            
             return        
         channel = message['channel']        
-        collection = db.slock_bot_commit
-        keyword_all = collection.find()        
-        # 遍歷每條資料
-        for doc in keyword_all:            
-            message_text = doc.get('message')
-            if re.search(re.escape(message_text), text):                            
-                # 檢查是否有 file 欄位
-                file_name = doc.get('file')
-                if file_name:
-                    # 有檔案，構建檔案路徑
-                    file_path = os.path.join('slack_images', file_name)
-                else:
-                    # 沒有檔案，設定為 None
-                    file_path = None
-                
-                send_image(channel, doc['say'], say, file_path)           
-                return
+        # 以記憶體中的關鍵字索引比對，單次掃描訊息文字
+        doc = keyword_index.match(text)
+        if doc:
+            # 檢查是否有 file 欄位
+            file_name = doc.get('file')
+            if file_name:
+                # 有檔案，構建檔案路徑
+                file_path = os.path.join('slack_images', file_name)
+            else:
+                # 沒有檔案，設定為 None
+                file_path = None
+            
+            send_image(channel, doc['say'], say, file_path)
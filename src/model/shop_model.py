@@ -1,7 +1,10 @@
 import re
+import threading
+import time
 from datetime import datetime, timedelta
-from pymongo import MongoClient
-from .coin_model import record_coin_change
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from .coin_model import debit_coins, invalidate_active_effects
 # 商品清單，可依需求擴充
 SHOP_ITEMS = [
     {
@@ -73,7 +76,19 @@ SHOP_ITEMS = [
 COMMANDS_HELP = [
     ("!商店", "查看商店商品列表"),
     ("!購買 商品編號", "購買指定商品"),
-    ("!背包", "查看自己的購買背包")
+    ("!背包", "查看自己背包中仍有效的物品"),
+    ("!背包紀錄 [頁數]", "查看已過期物品的歷史紀錄")
+]
+
+SHOP_ARCHIVE_INTERVAL = 600  # 每 10 分鐘把過期物品移到 user_shops_history
+SHOP_ARCHIVE_BATCH = 500
+HISTORY_PAGE_SIZE = 10
+
+# 本模組需要的索引：(collection, keys, options)，由 bot_main 啟動時統一建立
+INDEXES = [
+    ("user_shops", [("user_id", 1), ("expire_at", 1)], {}),
+    ("user_shops", [("expire_at", 1)], {}),
+    ("user_shops_history", [("user_id", 1), ("expire_at", -1)], {}),
 ]
 
 
@@ -106,18 +121,10 @@ def shop_buy_handler(message, say, db):
     if not item:
         say("查無此商品，請輸入正確的商品編號。")
         return
-    # 查詢用戶現有幣
-    total = coin_collection.aggregate([
-        {"$match": {"user_id": user_id}},
-        {"$group": {"_id": "$user_id", "sum": {"$sum": "$coins"}}}
-    ])
-    total = list(total)
-    coins = total[0]["sum"] if total else 0
-    if coins < item["price"]:
+    # 扣款（餘額不足時不扣款）
+    if debit_coins(coin_collection, user_id, item["price"], "shop_buy") is None:
         say(f"<@{user_id}>，你的烏薩奇幣不足，無法購買 {item['name']}！")
         return
-    # 扣款
-    record_coin_change(coin_collection, user_id, -item["price"], "shop_buy", related_user=None)
     # 記錄購買，含效期
     expire_at = get_expire_at(item)
     shop_collection.insert_one({
@@ -129,16 +136,103 @@ def shop_buy_handler(message, say, db):
         "expire_at": expire_at,
         "effect": item["effect"]
     })
+    invalidate_active_effects(user_id)
     msg = f"<@{user_id}>，成功購買 {item['name']}！"
     if expire_at:
         msg += f" 效期至 {expire_at.strftime('%Y-%m-%d %H:%M:%S')}"
     say(msg)
 
+def _as_datetime(value):
+    """舊資料的 expire_at 可能是 ISO 字串，統一轉成 datetime；無法解析時回傳 None"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _format_expire(value):
+    expire_at = _as_datetime(value)
+    return expire_at.strftime('%Y-%m-%d %H:%M:%S') if expire_at else str(value)
+
+
+def normalize_expire_at(db):
+    """
+    把 user_shops / user_shops_history 中字串格式的 expire_at 轉成 datetime，回傳轉換筆數。
+    背包與封存都依 datetime 範圍查詢，字串不會被比對到，需在啟動時先轉換。
+    """
+    converted = 0
+    for collection in (db.user_shops, db.user_shops_history):
+        ops = []
+        for item in collection.find({"expire_at": {"$type": "string"}}, {"expire_at": 1}):
+            expire_at = _as_datetime(item["expire_at"])
+            if expire_at is None:
+                print(f"無法解析物品效期 {item['_id']}: {item['expire_at']}")
+                continue
+            ops.append(UpdateOne({"_id": item["_id"]}, {"$set": {"expire_at": expire_at}}))
+        if ops:
+            converted += collection.bulk_write(ops, ordered=False).modified_count
+    return converted
+
+
+def archive_expired_items(db):
+    """
+    將 user_shops 中已過期的物品搬到 user_shops_history，回傳搬移筆數。
+    先寫入歷史再刪除；保留原 _id，中途失敗重跑時不會重複寫入。
+    """
+    shop_collection = db.user_shops
+    history_collection = db.user_shops_history
+    moved = 0
+    while True:
+        now = datetime.now()
+        items = list(shop_collection.find({"expire_at": {"$lte": now}}).limit(SHOP_ARCHIVE_BATCH))
+        if not items:
+            break
+        for item in items:
+            item["archived_at"] = now
+        try:
+            history_collection.insert_many(items, ordered=False)
+        except BulkWriteError as e:
+            # 只允許重複 _id（上次已寫入歷史但尚未刪除）
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        shop_collection.delete_many({"_id": {"$in": [item["_id"] for item in items]}})
+        moved += len(items)
+        if len(items) < SHOP_ARCHIVE_BATCH:
+            break
+    return moved
+
+
+def start_shop_archiver(db, interval=SHOP_ARCHIVE_INTERVAL):
+    """背景定期搬移過期物品"""
+    def run():
+        while True:
+            try:
+                moved = archive_expired_items(db)
+                if moved:
+                    print(f"✅ 已封存 {moved} 筆過期物品")
+            except Exception as e:
+                print(f"封存過期物品失敗: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
 def shop_bag_handler(message, say, db):
     shop_collection = db.user_shops
     user_id = message['user']
     now = datetime.now()
-    items = list(shop_collection.find({"user_id": user_id}))
+    # 只列出仍有效的物品（過期物品由封存程序移到歷史紀錄）
+    items = list(shop_collection.find({
+        "user_id": user_id,
+        "$or": [
+            {"expire_at": None},
+            {"expire_at": {"$gt": now}}
+        ]
+    }))
     if not items:
         say(f"<@{user_id}>，你的背包是空的，快去 !商店 買東西吧！")
         return
@@ -146,18 +240,40 @@ def shop_bag_handler(message, say, db):
     for i, item in enumerate(items, 1):
         expire_str = ""
         if item.get("expire_at"):
-            expire_at = item["expire_at"]
-            if isinstance(expire_at, str):
-                expire_at = datetime.fromisoformat(expire_at)
-            if expire_at < now:
-                expire_str = "（已過期）"
-            else:
-                expire_str = f"（效期至 {expire_at.strftime('%Y-%m-%d %H:%M:%S')}）"
+            expire_str = f"（效期至 {_format_expire(item['expire_at'])}）"
         msg += f"{i}. {item['item_name']}（{item['price']} 幣）{expire_str}\n"
     say(msg)
 
+def shop_history_handler(message, say, db):
+    history_collection = db.user_shops_history
+    user_id = message['user']
+    match = re.match(r"^!背包紀錄(?:\s+(\d+))?$", message['text'])
+    page = max(int(match.group(1)), 1) if match and match.group(1) else 1
+    total = history_collection.count_documents({"user_id": user_id})
+    if total == 0:
+        say(f"<@{user_id}>，你還沒有過期物品的紀錄。")
+        return
+    pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    page = min(page, pages)
+    items = history_collection.find(
+        {"user_id": user_id},
+        {"_id": 0, "item_name": 1, "price": 1, "expire_at": 1}
+    ).sort("expire_at", -1).skip((page - 1) * HISTORY_PAGE_SIZE).limit(HISTORY_PAGE_SIZE)
+    msg = f"<@{user_id}> 的過期物品紀錄（第 {page}/{pages} 頁，共 {total} 筆）：\n"
+    for i, item in enumerate(items, (page - 1) * HISTORY_PAGE_SIZE + 1):
+        msg += f"{i}. {item['item_name']}（{item['price']} 幣）於 {_format_expire(item.get('expire_at'))} 過期\n"
+    say(msg)
+
 # 綁定到 app
 def register_shop_handlers(app, config, db):
+    try:
+        converted = normalize_expire_at(db)
+        if converted:
+            print(f"✅ 已將 {converted} 筆物品效期轉為 datetime")
+    except Exception as e:
+        print(f"轉換物品效期格式失敗: {e}")
+    start_shop_archiver(db)
+
     @app.message(re.compile(r"^!商店$"))
     def _(message, say):
         shop_list_handler(message, say)
@@ -168,4 +284,8 @@ def register_shop_handlers(app, config, db):
 
     @app.message(re.compile(r"^!背包$"))
     def _(message, say):
-        shop_bag_handler(message, say, db)
\ No newline at end of file
+        shop_bag_handler(message, say, db)
+
+    @app.message(re.compile(r"^!背包紀錄(?:\s+(\d+))?$"))
+    def _(message, say):
+        shop_history_handler(message, say, db)
@@ -1,26 +1,33 @@
 import re
-from ..stock import get_stock_info, get_historical_data
+from ..stock import get_stock_infos, get_historical_data
+from ..jobs import submit_job
+
+MAX_QUERY_CODES = 20  # !查股 單次最多查詢的代碼數
 
 COMMANDS_HELP = [
-    ("!查股 股票代碼", "查詢指定股票即時資訊（支援上市/上櫃，盤後自動改用收盤快照）"),
-    ("!查股歷史 股票代碼 年月", "查詢上市股月歷史資料，年月格式 YYYYMM（例：!查股歷史 2330 202506）"),
+    ("!查股 代碼或名稱 [...]", "查詢一或多檔股票即時資訊（例：!查股 2330 台積電 0050，盤後自動改用收盤快照）"),
+    ("!查股歷史 股票代碼 年月", "查詢上市股歷史資料，年月格式 YYYYMM 或區間 YYYYMM-YYYYMM（例：!查股歷史 2330 202401-202506）"),
 ]
 
 
 def register_stock_handlers(app, config, db):
 
-    # !查股 <代碼>
-    @app.message(re.compile(r"^!查股\s+(\S+)$"))
+    # !查股 <代碼> [代碼...]
+    @app.message(re.compile(r"^!查股\s+(.+)$"))
     def search_stock(message, say):
-        code = re.match(r"^!查股\s+(\S+)$", message['text']).group(1).strip()
-        say(get_stock_info(code))
+        codes = re.match(r"^!查股\s+(.+)$", message['text']).group(1).split()
+        if len(codes) > MAX_QUERY_CODES:
+            say(f"❌ 一次最多查詢 {MAX_QUERY_CODES} 檔股票。")
+            return
+        say(get_stock_infos(codes))
 
     # !查股歷史 <代碼> [年月]
-    # 年月可省略，省略時使用當月
-    @app.message(re.compile(r"^!查股歷史\s+(\S+)(?:\s+(\d{6}))?$"))
+    # 年月可省略，省略時使用當月；也可輸入區間 YYYYMM-YYYYMM
+    @app.message(re.compile(r"^!查股歷史\s+(\S+)(?:\s+(\d{6}(?:-\d{6})?))?$"))
     def search_stock_history(message, say):
-        m = re.match(r"^!查股歷史\s+(\S+)(?:\s+(\d{6}))?$", message['text'])
+        m = re.match(r"^!查股歷史\s+(\S+)(?:\s+(\d{6}(?:-\d{6})?))?$", message['text'])
         code = m.group(1).strip()
         from datetime import datetime
         date = m.group(2) or datetime.now().strftime('%Y%m')
-        say(get_historical_data(code, date))
+        # 每月一次請求且有限速，區間查詢可能要數十秒，放到背景佇列執行
+        submit_job("stock", say, lambda: say(get_historical_data(code, date)))
@@ -1,17 +1,34 @@
+import json
+import os
+import re
 import requests
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 快取設定（避免每次查詢都打 OpenAPI）
 # ──────────────────────────────────────────────────────────────────────────────
 _snapshot_cache = {
-    'tse': {'data': {}, 'ts': 0},
-    'otc': {'data': {}, 'ts': 0},
+    'tse': {'data': {}, 'ts': 0, 'refreshing': False, 'restored': False},
+    'otc': {'data': {}, 'ts': 0, 'refreshing': False, 'restored': False},
 }
+# 每個市場同一時間只允許一個下載（single-flight）
+_refresh_locks = {'tse': threading.Lock(), 'otc': threading.Lock()}
+# 代碼 → 市場（'tse' / 'otc'），由快照與即時報價回應學習而來
+_code_market = {}
 _cache_lock = threading.Lock()
 CACHE_TTL = 300  # 快照資料快取 5 分鐘
+SNAPSHOT_RETRY = 60  # 快照刷新失敗時，1 分鐘後再試
+
+# 股票代碼目錄（代碼 / 名稱 / 市場），每日由快照重建並保存至磁碟
+STOCK_CACHE_DIR = os.path.join('cache', 'stock')
+SYMBOL_DIR_FILE = os.path.join(STOCK_CACHE_DIR, 'symbols.json')
+SYMBOL_DIR_TTL = 86400  # 目錄每日重建
+SYMBOL_DIR_RETRY = 600  # 重建失敗時，10 分鐘後再試
+_symbol_dir = {'symbols': {}, 'names': {}, 'ts': 0}
+_symbol_lock = threading.Lock()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 公用工具
@@ -36,32 +53,68 @@ def _change_str(close_val, change_val):
         return '', _fmt(change_val)
 
 
+def _write_json_atomic(path: str, payload):
+    """寫入暫存檔後再替換，避免重啟時讀到寫到一半的檔案"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 即時報價（mis.twse.com.tw，每 5 秒更新，盤中使用）
 # ──────────────────────────────────────────────────────────────────────────────
-def _fetch_realtime(code: str, market: str):
+REALTIME_BATCH_SIZE = 50  # 單次 ex_ch 最多帶入的代碼數
+
+
+def _remember_market(code: str, market: str):
+    """記錄 代碼 → 市場 對照"""
+    with _cache_lock:
+        _code_market[code] = market
+
+
+def _known_market(code: str):
+    """回傳已知的市場（'tse' / 'otc'），未知時回傳 None"""
+    _ensure_symbol_directory()
+    with _cache_lock:
+        return _code_market.get(code)
+
+
+def _fetch_realtime_batch(codes) -> dict:
     """
-    向 mis.twse.com.tw 查詢即時報價。
-    market: 'tse'（上市）或 'otc'（上櫃）
-    回傳 dict 或 None（查無資料 / 未開盤）
+    以單一請求向 mis.twse.com.tw 查詢多檔即時報價。
+    已知市場的代碼只送對應市場；未知的同時送 tse_ 與 otc_，由回應決定。
+    回傳 {股票代碼: 原始 dict}，查無資料 / 未開盤的代碼不會出現在結果中。
     """
-    url = (
-        f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp"
-        f"?json=1&delay=0&ex_ch={market}_{code}.tw"
-    )
-    try:
-        resp = requests.get(url, timeout=6, headers={'Referer': 'https://mis.twse.com.tw'})
-        data = resp.json()
-        arr = data.get('msgArray', [])
-        if not arr:
-            return None
-        s = arr[0]
-        # z = 最新成交價；若 z 與 y（昨收）皆為 '-'，視為無效資料
-        if s.get('z', '-') in ('-', '--') and s.get('y', '-') in ('-', '--'):
-            return None
-        return s
-    except Exception:
-        return None
+    channels = []
+    for code in codes:
+        market = _known_market(code)
+        markets = (market,) if market else ('tse', 'otc')
+        channels.extend(f"{m}_{code}.tw" for m in markets)
+
+    result = {}
+    for i in range(0, len(channels), REALTIME_BATCH_SIZE):
+        url = (
+            f"https://mis.twse.com.tw/stock/api/getStockInfo.jsp"
+            f"?json=1&delay=0&ex_ch={'|'.join(channels[i:i + REALTIME_BATCH_SIZE])}"
+        )
+        try:
+            resp = requests.get(url, timeout=6, headers={'Referer': 'https://mis.twse.com.tw'})
+            arr = resp.json().get('msgArray', [])
+        except Exception:
+            continue
+        for s in arr:
+            code = s.get('c')
+            if not code:
+                continue
+            if s.get('ex') in ('tse', 'otc'):
+                _remember_market(code, s['ex'])
+            # z = 最新成交價；若 z 與 y（昨收）皆為 '-'，視為無效資料
+            if s.get('z', '-') in ('-', '--') and s.get('y', '-') in ('-', '--'):
+                continue
+            result[code] = s
+    return result
 
 
 def _format_realtime(s: dict) -> str:
@@ -93,18 +146,17 @@ def _format_realtime(s: dict) -> str:
 # ──────────────────────────────────────────────────────────────────────────────
 # 日收盤快照（盤後 / 查無即時資料時的 fallback）
 # ──────────────────────────────────────────────────────────────────────────────
-def _load_snapshot(market: str) -> dict:
+def _snapshot_file(market: str) -> str:
+    return os.path.join(STOCK_CACHE_DIR, f'snapshot_{market}.json')
+
+
+def _fetch_snapshot(market: str):
     """
-    載入整市場快照並快取。
+    下載整市場快照。
     TSE → openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL
     OTC → www.tpex.org.tw/openapi/v1/tpex_mainboard_quotes
-    回傳 {股票代碼: 原始 dict}
+    回傳 {股票代碼: 原始 dict}，失敗時回傳 None
     """
-    with _cache_lock:
-        cache = _snapshot_cache[market]
-        if time.time() - cache['ts'] < CACHE_TTL and cache['data']:
-            return cache['data']
-
     if market == 'tse':
         url = 'https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL'
         code_key = 'Code'
@@ -116,12 +168,169 @@ def _load_snapshot(market: str) -> dict:
         resp = requests.get(url, timeout=10)
         rows = resp.json()
         data = {str(r.get(code_key, '')).strip(): r for r in rows if r.get(code_key)}
-        with _cache_lock:
-            _snapshot_cache[market]['data'] = data
-            _snapshot_cache[market]['ts'] = time.time()
-        return data
+        return data or None
     except Exception:
-        return {}
+        return None
+
+
+def _store_snapshot(market: str, data: dict, ts: float):
+    """更新記憶體快取與 代碼 → 市場 對照"""
+    with _cache_lock:
+        _snapshot_cache[market]['data'] = data
+        _snapshot_cache[market]['ts'] = ts
+        for code in data:
+            _code_market[code] = market
+
+
+def _restore_snapshot(market: str):
+    """啟動後第一次使用時，從磁碟載入上次保存的快照（即使已過期也先拿來用）"""
+    with _cache_lock:
+        if _snapshot_cache[market]['restored']:
+            return
+        _snapshot_cache[market]['restored'] = True
+    try:
+        with open(_snapshot_file(market), encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return
+    if saved.get('data'):
+        with _cache_lock:
+            if _snapshot_cache[market]['data']:
+                return
+        _store_snapshot(market, saved['data'], saved.get('ts', 0))
+
+
+def _refresh_snapshot(market: str) -> dict:
+    """
+    重新下載快照（single-flight）：同市場同時只有一個下載，
+    等待中的呼叫者在前一個下載完成後直接使用其結果。
+    """
+    try:
+        with _refresh_locks[market]:
+            with _cache_lock:
+                cache = _snapshot_cache[market]
+                if time.time() - cache['ts'] < CACHE_TTL and cache['data']:
+                    return cache['data']
+
+            data = _fetch_snapshot(market)
+            if data is None:
+                with _cache_lock:
+                    # 保留舊資料，稍後再試
+                    if cache['data']:
+                        cache['ts'] = time.time() - CACHE_TTL + SNAPSHOT_RETRY
+                    return cache['data']
+
+            now = time.time()
+            _store_snapshot(market, data, now)
+            try:
+                _write_json_atomic(_snapshot_file(market), {'ts': now, 'data': data})
+            except Exception as e:
+                print(f"寫入 {market} 快照失敗: {e}")
+            return data
+    finally:
+        with _cache_lock:
+            _snapshot_cache[market]['refreshing'] = False
+
+
+def _load_snapshot(market: str) -> dict:
+    """
+    取得整市場快照（stale-while-revalidate）。
+    快取過期但仍有舊資料時立即回傳舊資料，並在背景刷新；
+    完全沒有資料時才同步下載。
+    回傳 {股票代碼: 原始 dict}
+    """
+    _restore_snapshot(market)
+    with _cache_lock:
+        cache = _snapshot_cache[market]
+        if cache['data']:
+            if time.time() - cache['ts'] >= CACHE_TTL and not cache['refreshing']:
+                cache['refreshing'] = True
+                threading.Thread(target=_refresh_snapshot, args=(market,), daemon=True).start()
+            return cache['data']
+
+    return _refresh_snapshot(market)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 股票代碼目錄（代碼 → 名稱 / 市場，支援名稱查詢）
+# ──────────────────────────────────────────────────────────────────────────────
+def _set_symbol_directory(symbols: dict, ts: float):
+    """替換記憶體中的目錄並同步 代碼 → 市場 對照"""
+    names = {}
+    for code, entry in symbols.items():
+        names.setdefault(entry['name'], code)
+    with _cache_lock:
+        _symbol_dir['symbols'] = symbols
+        _symbol_dir['names'] = names
+        _symbol_dir['ts'] = ts
+        for code, entry in symbols.items():
+            _code_market.setdefault(code, entry['market'])
+
+
+def refresh_symbol_directory() -> int:
+    """
+    由上市 / 上櫃日收盤快照重建股票代碼目錄並寫入磁碟。
+    兩個來源皆未提供 ISIN，isin 欄位保留為 None。
+    回傳目錄中的代碼數。
+    """
+    symbols = {}
+    for code, r in _load_snapshot('tse').items():
+        symbols[code] = {'code': code, 'name': str(r.get('Name', '')).strip(), 'market': 'tse', 'isin': None}
+    for code, r in _load_snapshot('otc').items():
+        symbols.setdefault(code, {'code': code, 'name': str(r.get('CompanyName', '')).strip(), 'market': 'otc', 'isin': None})
+    if not symbols:
+        with _cache_lock:
+            _symbol_dir['ts'] = time.time() - SYMBOL_DIR_TTL + SYMBOL_DIR_RETRY
+        return 0
+
+    now = time.time()
+    _set_symbol_directory(symbols, now)
+    try:
+        _write_json_atomic(SYMBOL_DIR_FILE, {'ts': now, 'symbols': symbols})
+    except Exception as e:
+        print(f"寫入股票代碼目錄失敗: {e}")
+    return len(symbols)
+
+
+def _ensure_symbol_directory():
+    """目錄不存在或超過一天時，先讀磁碟，仍過期才重新建立"""
+    if time.time() - _symbol_dir['ts'] < SYMBOL_DIR_TTL:
+        return
+    with _symbol_lock:
+        if time.time() - _symbol_dir['ts'] < SYMBOL_DIR_TTL:
+            return
+        try:
+            with open(SYMBOL_DIR_FILE, encoding='utf-8') as f:
+                saved = json.load(f)
+            if time.time() - saved.get('ts', 0) < SYMBOL_DIR_TTL and saved.get('symbols'):
+                _set_symbol_directory(saved['symbols'], saved['ts'])
+                return
+        except (OSError, ValueError):
+            pass
+        refresh_symbol_directory()
+
+
+def resolve_symbol(query: str):
+    """
+    將代碼或名稱解析為股票代碼。
+    回傳 (代碼, 候選清單)：唯一命中時代碼有值；名稱模糊比對到多筆時代碼為 None，候選清單為 [(代碼, 名稱), ...]。
+    """
+    query = query.strip()
+    _ensure_symbol_directory()
+    with _cache_lock:
+        symbols = _symbol_dir['symbols']
+        names = _symbol_dir['names']
+    if query in symbols:
+        return query, []
+    if query in names:
+        return names[query], []
+    matches = [(code, e['name']) for code, e in symbols.items() if query in e['name']]
+    if len(matches) == 1:
+        return matches[0][0], []
+    if matches:
+        return None, sorted(matches)
+    # 目錄中沒有的代碼仍交給即時報價嘗試（例如新上市股票）
+    return query, []
 
 
 def _format_snapshot_tse(code: str, s: dict) -> str:
@@ -171,71 +380,215 @@ def _format_snapshot_otc(code: str, s: dict) -> str:
 # ──────────────────────────────────────────────────────────────────────────────
 # 對外主函式
 # ──────────────────────────────────────────────────────────────────────────────
+def _snapshot_info(code: str):
+    """從日收盤快照取得格式化資訊，已知市場優先查詢；查無時回傳 None"""
+    markets = ('tse', 'otc')
+    if _known_market(code) == 'otc':
+        markets = ('otc', 'tse')
+    for market in markets:
+        snap = _load_snapshot(market)
+        if code in snap:
+            if market == 'tse':
+                return _format_snapshot_tse(code, snap[code])
+            return _format_snapshot_otc(code, snap[code])
+    return None
+
+
+def get_stock_infos(stock_codes) -> str:
+    """
+    一次查詢多檔台股即時資訊（可輸入代碼或名稱），依代碼目錄判斷上市 / 上櫃。
+    所有代碼的即時報價合併為單一請求；盤後或查無即時資料的代碼改用日收盤快照。
+    """
+    blocks = []
+    codes = []
+    for query in dict.fromkeys(c.strip() for c in stock_codes if c.strip()):
+        code, candidates = resolve_symbol(query)
+        if code:
+            codes.append(code)
+            continue
+        shown = '、'.join(f"{name}({c})" for c, name in candidates[:10])
+        more = f" 等 {len(candidates)} 筆" if len(candidates) > 10 else ''
+        blocks.append(f"🔍 `{query}` 符合多檔股票：{shown}{more}，請輸入完整名稱或代碼。")
+
+    codes = list(dict.fromkeys(codes))
+    realtime = _fetch_realtime_batch(codes) if codes else {}
+
+    for code in codes:
+        if code in realtime:
+            blocks.append(_format_realtime(realtime[code]))
+            continue
+        info = _snapshot_info(code)
+        if info:
+            blocks.append(info)
+        else:
+            blocks.append(f"❌ 找不到股票代碼 `{code}`，請確認代碼正確（上市股或上櫃股）。")
+    return '\n\n'.join(blocks)
+
+
 def get_stock_info(stock_code: str) -> str:
     """
     查詢台股即時資訊，自動判斷上市 / 上櫃。
     優先使用即時報價；盤後或查無即時資料時改用日收盤快照。
     """
-    code = stock_code.strip()
+    return get_stock_infos([stock_code])
 
-    # 1. 嘗試即時報價（上市 → 上櫃）
-    for market in ('tse', 'otc'):
-        s = _fetch_realtime(code, market)
-        if s:
-            return _format_realtime(s)
 
-    # 2. 即時資料不可用 → 改用日收盤快照（上市 → 上櫃）
-    tse_snap = _load_snapshot('tse')
-    if code in tse_snap:
-        return _format_snapshot_tse(code, tse_snap[code])
+# ──────────────────────────────────────────────────────────────────────────────
+# 歷史資料（TWSE afterTrading API）
+# ──────────────────────────────────────────────────────────────────────────────
+HISTORY_DIR = os.path.join(STOCK_CACHE_DIR, 'history')
+HISTORY_CURRENT_TTL = 600    # 當月資料仍在變動，10 分鐘後重新抓取
+HISTORY_SETTLE_MARGIN = 86400  # 月底後再過一天抓到的資料才視為完整
+HISTORY_MAX_MONTHS = 24      # 區間查詢最多月份數
+HISTORY_WORKERS = 3          # 同時抓取的月份數
+HISTORY_MIN_INTERVAL = 2.0   # TWSE 對頻繁請求會封鎖 IP，兩次請求至少間隔 2 秒
+_history_rate_lock = threading.Lock()
+_history_next_at = [0.0]
 
-    otc_snap = _load_snapshot('otc')
-    if code in otc_snap:
-        return _format_snapshot_otc(code, otc_snap[code])
 
-    return f"❌ 找不到股票代碼 `{code}`，請確認代碼正確（上市股或上櫃股）。"
+def _wait_history_slot():
+    """限速：依序分配請求時間點，確保請求間隔不小於 HISTORY_MIN_INTERVAL"""
+    with _history_rate_lock:
+        now = time.monotonic()
+        at = max(now, _history_next_at[0])
+        _history_next_at[0] = at + HISTORY_MIN_INTERVAL
+    if at > now:
+        time.sleep(at - now)
 
 
-# ──────────────────────────────────────────────────────────────────────────────
-# 歷史資料（TWSE afterTrading API）
-# ──────────────────────────────────────────────────────────────────────────────
-def get_historical_data(stock_code: str, date: str) -> str:
+def _history_file(stock_code: str, month: str) -> str:
+    return os.path.join(HISTORY_DIR, stock_code, f'{month}.json')
+
+
+def _month_settled_at(month: str) -> float:
+    """該月份資料完整的時間點：次月一日再加上 HISTORY_SETTLE_MARGIN"""
+    y, m = int(month[:4]), int(month[4:])
+    y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return datetime(y, m, 1).timestamp() + HISTORY_SETTLE_MARGIN
+
+
+def _get_history_month(stock_code: str, month: str):
     """
-    查詢 TSE 上市股票月歷史資料。
-    Args:
-        stock_code: 股票代碼（例如 '2330'）
-        date: 年月（格式 'YYYYMM'，例如 '202506'）
+    取得單月歷史資料（TWSE STOCK_DAY 原始回應）。
+    月份結束後才抓到的本地檔案永久使用；月中抓到的檔案（含當月）超過
+    HISTORY_CURRENT_TTL 就重新抓取並覆寫，避免缺少月底的交易日。
+    回傳 (data, 錯誤訊息)，成功時錯誤訊息為 None。
     """
-    # 補齊為 YYYYMM01
-    if len(date) == 6:
-        date = date + '01'
+    path = _history_file(stock_code, month)
+    saved = None
+    try:
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        fetched_at = saved.get('fetched_at', 0)
+        if fetched_at >= _month_settled_at(month) or time.time() - fetched_at < HISTORY_CURRENT_TTL:
+            return saved['data'], None
+    except (OSError, ValueError, KeyError, AttributeError):
+        saved = None
 
     url = (
         f"https://www.twse.com.tw/rwd/zh/afterTrading/STOCK_DAY"
-        f"?date={date}&stockNo={stock_code}&response=json"
+        f"?date={month}01&stockNo={stock_code}&response=json"
     )
+    _wait_history_slot()
     try:
         resp = requests.get(url, timeout=10)
         data = resp.json()
     except Exception as e:
-        return f"❌ 查詢失敗：{e}"
+        # 重新抓取失敗時，先用本地較舊的資料
+        if saved and 'data' in saved:
+            return saved['data'], None
+        return None, f"❌ 查詢失敗：{e}"
 
     if not data or data.get('stat') not in ('OK', 'ok'):
+        if saved and 'data' in saved:
+            return saved['data'], None
         stat = data.get('stat', '無回應') if data else '無回應'
-        return f"❌ 查無資料（{stat}），請確認股票代碼與日期是否正確。"
+        return None, f"❌ 查無資料（{stat}），請確認股票代碼與日期是否正確。"
 
-    rows = data.get('data', [])
-    if not rows:
-        return "❌ 該月份無交易資料。"
+    try:
+        _write_json_atomic(path, {'fetched_at': time.time(), 'data': data})
+    except Exception as e:
+        print(f"寫入歷史資料失敗 {stock_code} {month}: {e}")
+    return data, None
 
-    title = data.get('title', f'{stock_code} 歷史資料')
-    lines = [f"📊 *{title}*"]
-    lines.append("日期　　　開盤　最高　最低　收盤　漲跌")
+
+def _month_range(start: str, end: str) -> list:
+    """列出 start ~ end（YYYYMM，含頭尾）之間的所有月份"""
+    y, m = int(start[:4]), int(start[4:])
+    months = []
+    while f"{y:04d}{m:02d}" <= end:
+        months.append(f"{y:04d}{m:02d}")
+        m += 1
+        if m > 12:
+            y, m = y + 1, 1
+    return months
+
+
+def _format_history_rows(rows) -> list:
+    lines = []
     for r in rows:
         # r = [日期, 成交股數, 成交金額, 開盤, 最高, 最低, 收盤, 漲跌, 筆數]
         lines.append(
             f"{r[0]}　{r[3]:>6}　{r[4]:>6}　{r[5]:>6}　{r[6]:>6}　{r[7]:>7}"
         )
+    return lines
+
+
+def get_historical_data(stock_code: str, date: str) -> str:
+    """
+    查詢 TSE 上市股票月歷史資料。
+    Args:
+        stock_code: 股票代碼（例如 '2330'）
+        date: 年月（格式 'YYYYMM'，例如 '202506'），或區間 'YYYYMM-YYYYMM'（例如 '202401-202506'）
+    """
+    stock_code = stock_code.strip()
+    if not re.fullmatch(r'[0-9A-Za-z]+', stock_code):
+        return f"❌ 股票代碼格式錯誤：`{stock_code}`"
+    m = re.fullmatch(r'(\d{6})(?:\d{2})?(?:-(\d{6}))?', date.strip())
+    if not m:
+        return "❌ 日期格式錯誤，請使用 YYYYMM 或 YYYYMM-YYYYMM。"
+    start, end = m.group(1), m.group(2) or m.group(1)
+    this_month = datetime.now().strftime('%Y%m')
+    end = min(end, this_month)
+    if not ('01' <= start[4:] <= '12' and '01' <= end[4:] <= '12') or start > end:
+        return "❌ 日期區間不正確。"
+
+    months = _month_range(start, end)
+    if len(months) > HISTORY_MAX_MONTHS:
+        return f"❌ 區間最多 {HISTORY_MAX_MONTHS} 個月。"
+
+    # 單月查詢維持原本的輸出格式
+    if len(months) == 1:
+        data, error = _get_history_month(stock_code, months[0])
+        if error:
+            return error
+        rows = data.get('data', [])
+        if not rows:
+            return "❌ 該月份無交易資料。"
+        title = data.get('title', f'{stock_code} 歷史資料')
+        lines = [f"📊 *{title}*"]
+        lines.append("日期　　　開盤　最高　最低　收盤　漲跌")
+        lines.extend(_format_history_rows(rows))
+        return '\n'.join(lines)
+
+    with ThreadPoolExecutor(max_workers=HISTORY_WORKERS) as executor:
+        results = list(executor.map(lambda mon: _get_history_month(stock_code, mon), months))
+
+    rows = []
+    missing = []
+    for mon, (data, error) in zip(months, results):
+        if error or not data.get('data'):
+            missing.append(mon)
+            continue
+        rows.extend(data['data'])
+    if not rows:
+        return "❌ 查無資料，請確認股票代碼與日期是否正確。"
+
+    lines = [f"📊 *{stock_code} 歷史資料（{start}～{end}）*"]
+    lines.append("日期　　　開盤　最高　最低　收盤　漲跌")
+    lines.extend(_format_history_rows(rows))
+    if missing:
+        lines.append(f"_（以下月份查無資料：{', '.join(missing)}）_")
     return '\n'.join(lines)
 
 
@@ -0,0 +1,54 @@
+import re
+import unittest
+from unittest.mock import MagicMock
+
+import bson
+
+from src.model.coin_model import register_coin_handlers
+
+
+class FakeApp:
+    """收集 @app.message 註冊的 handler，依指令文字呼叫"""
+
+    def __init__(self):
+        self.handlers = []
+
+    def message(self, pattern):
+        def decorator(fn):
+            self.handlers.append((pattern, fn))
+            return fn
+        return decorator
+
+    def dispatch(self, text, user="U1"):
+        replies = []
+        for pattern, fn in self.handlers:
+            if re.match(pattern, text):
+                fn({"user": user, "text": text}, lambda msg, **kwargs: replies.append(msg))
+                return replies
+        raise AssertionError(f"沒有處理 {text} 的 handler")
+
+
+def encode_query(filter_doc, update, **kwargs):
+    """模擬送往 MongoDB 前的 BSON 編碼（超過 int64 時 bson 會拋出 OverflowError）"""
+    bson.encode(filter_doc)
+    bson.encode(update)
+    return None
+
+
+class DebitAmountTest(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.user_coins.estimated_document_count.return_value = 0
+        self.db.user_shops.find.return_value = []
+        self.db.user_coins.database.user_balances.find_one_and_update.side_effect = encode_query
+        self.app = FakeApp()
+        register_coin_handlers(self.app, {}, self.db)
+
+    def test_slot_bet_above_int64_reports_insufficient_coins(self):
+        replies = self.app.dispatch("!拉霸 99999999999999999999")
+        self.assertEqual(len(replies), 1)
+        self.assertIn("不足", replies[0])
+
+
+if __name__ == "__main__":
+    unittest.main()